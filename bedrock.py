@@ -1,23 +1,132 @@
-import boto3
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from functools import partial
 
 from config import Config
+from metrics import registry
 
+GOD_SECONDS = registry.histogram("mcds_god_seconds", "Time for God to answer a question, once it's dispatched")
+GOD_FAILURES = registry.counter("mcds_god_failures_total", "God questions that timed out or failed")
 
-class God:
-    MAX_GEN_LEN = 256
 
-    def __init__(self):
+class FlowBackend(ABC):
+    @abstractmethod
+    def stream(self, prompt):
+        """
+        Invokes the flow with `prompt`, returning an async iterator over the flow's output documents.
+        """
+        pass
+
+    async def close(self):
+        pass
+
+
+class BedrockFlowBackend(FlowBackend):
+    """
+    Invokes a Bedrock flow with a shared boto3 client.
+
+    boto3 is blocking, so calls run on a dedicated executor sized to max_concurrency (rather than the loop's default
+    executor), and the client's connection pool is sized to match so connections are reused across questions. The
+    response stream is read one event at a time, so outputs are yielded as soon as they arrive.
+    """
+
+    def __init__(self, max_concurrency):
+        import boto3
+        from botocore.config import Config as BotoConfig
+
         self.bedrock = boto3.client(
             "bedrock-agent-runtime",
             aws_access_key_id=Config.aws_access_key_id,
             aws_secret_access_key=Config.aws_secret_access_key,
             region_name=Config.aws_region,
+            config=BotoConfig(
+                max_pool_connections=max_concurrency,
+                connect_timeout=5,
+                read_timeout=Config.god_timeout_seconds,
+            ),
         )
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="god")
         self.flow_id = Config.flow_id
         self.flow_alias_id = Config.flow_alias_id
 
+    async def stream(self, prompt):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(self.executor, partial(
+            self.bedrock.invoke_flow,
+            flowAliasIdentifier=self.flow_alias_id,
+            flowIdentifier=self.flow_id,
+            inputs=[
+                {
+                    "content": { "document": prompt },
+                    "nodeName": "FlowInputNode",
+                    "nodeOutputName": "document",
+                }
+            ]
+        ))
+
+        response_stream = response["responseStream"]
+        events = iter(response_stream)
+        try:
+            while (event := await loop.run_in_executor(self.executor, next, events, None)) is not None:
+                if "flowOutputEvent" in event:
+                    yield event["flowOutputEvent"]["content"]["document"]
+        finally:
+            response_stream.close()
+
+    async def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class HttpFlowBackend(FlowBackend):
+    """
+    Invokes a flow served over HTTP, e.g. a local fake flow server for testing.
+
+    The prompt is POSTed as `{"document": prompt}`, and the response body is read as newline-delimited JSON objects of
+    the form `{"document": output}`. One aiohttp session (and its connection pool) is reused for every question.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.session = None
+
+    async def stream(self, prompt):
+        import aiohttp
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+
+        async with self.session.post(self.url, json={"document": prompt}) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                line = line.strip()
+                if not line:
+                    continue
+                yield json.loads(line)["document"]
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class God:
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = God.default_backend()
+        self.backend = backend
+        self.timeout = Config.god_timeout_seconds
+        self.in_flight = asyncio.Semaphore(Config.god_max_concurrency)
+
+        self.questions = 0
+        self.total_queue_wait = 0.0
+
     @staticmethod
     def available():
+        if Config.god_flow_url is not None:
+            return True
         if Config.aws_access_key_id is None:
             return False
         if Config.flow_id is None:
@@ -26,41 +135,73 @@ class God:
             return False
         return True
 
-    def ask(self, requester, statement, context_log):
-        prompt = f"{requester} says: {statement}\n\n"
-        prompt += "The following events occurred on the server prior to this statement:\n"
-        for message in context_log:
-            prompt += f"> {message}\n"
+    @staticmethod
+    def default_backend():
+        if Config.god_flow_url is not None:
+            return HttpFlowBackend(Config.god_flow_url)
+        return BedrockFlowBackend(Config.god_max_concurrency)
 
-        response = self.bedrock.invoke_flow(
-            flowAliasIdentifier=self.flow_alias_id,
-            flowIdentifier=self.flow_id,
-            inputs=[
-                {
-                    "content": { "document": prompt },
-                    "nodeName": "FlowInputNode",
-                    "nodeOutputName": "document",
-                }
-            ]
+    @staticmethod
+    def prompt(requester, statement, context):
+        return (
+            f"{requester} says: {statement}\n\n"
+            "The following events occurred on the server prior to this statement:\n"
+            f"{context}"
         )
 
-        for event in response["responseStream"]:
-            if "flowOutputEvent" in event:
-                content = event["flowOutputEvent"]["content"]["document"]
-                return content
+    async def ask(self, requester, statement, context, on_partial=None):
+        """
+        Asks the flow a question and returns its reply. `context` is the description of prior events, as assembled by
+        Journal.context(). `on_partial` is awaited with each output as it streams in. Raises asyncio.TimeoutError if the
+        flow doesn't finish within the configured timeout.
+        """
+        prompt = God.prompt(requester, statement, context)
+        queued = time.monotonic()
+        async with self.in_flight:
+            self.questions += 1
+            self.total_queue_wait += time.monotonic() - queued
+            start = time.monotonic()
+            try:
+                reply = await asyncio.wait_for(self._collect(prompt, on_partial), self.timeout)
+            except Exception:
+                GOD_FAILURES.inc()
+                raise
+            GOD_SECONDS.observe(time.monotonic() - start)
+            return reply
+
+    def average_queue_wait(self):
+        if self.questions == 0:
+            return 0.0
+        return self.total_queue_wait / self.questions
+
+    async def _collect(self, prompt, on_partial):
+        outputs = []
+        async with aclosing(self.backend.stream(prompt)) as stream:
+            async for output in stream:
+                outputs.append(output)
+                if on_partial is not None:
+                    await on_partial(output)
 
-        assert False, "No flowOutputEvent in responseStream"
+        assert outputs, "No flowOutputEvent in responseStream"
+        return "".join(outputs)
+
+    async def close(self):
+        await self.backend.close()
 
 
 if __name__ == '__main__':
-    from collections import deque
+    from journal import Journal
     from mc_event import PlayerMessage
 
-    test_history = deque(maxlen=30)
-    test_history.append(PlayerMessage("player1", "Hello, world!"))
-    test_history.append(PlayerMessage("player2", "Hello, player1!"))
-    test_history.append(PlayerMessage("player1", "Hello, player2!"))
+    test_history = Journal()
+    test_history.record(PlayerMessage("player1", "Hello, world!"))
+    test_history.record(PlayerMessage("player2", "Hello, player1!"))
+    test_history.record(PlayerMessage("player1", "Hello, player2!"))
+
+    async def main():
+        god = God()
+        print(await god.ask("player1", "God, which player said hello first?", test_history.context()))
+        print(await god.ask("player1", "God, how do I triple ores in mekanism?", test_history.context()))
+        await god.close()
 
-    god = God()
-    print(god.ask("player1", "God, which player said hello first?", test_history))
-    print(god.ask("player1", "God, how do I triple ores in mekanism?", test_history))
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+import discord
+
+
+class ChannelRegistry:
+    """
+    Caches the resolved text channels of the bot's category in every guild.
+
+    Send paths look channels up by name in O(1) instead of scanning each guild's categories and channels. The cache is
+    marked stale by invalidate() whenever channels or guilds change, and is re-resolved on the next lookup.
+    """
+
+    def __init__(self, category_name, channel_names):
+        self.category_name = category_name
+        self.channel_names = channel_names
+
+        self.guilds = []
+        self._channels = {}
+        self._by_name = {}
+        self.stale = True
+
+    def resolve(self, guilds):
+        self.guilds = list(guilds)
+        self._channels = {}
+        self._by_name = {channel_name: [] for channel_name in self.channel_names}
+        for guild in self.guilds:
+            category = discord.utils.get(guild.categories, name=self.category_name)
+            if category is None:
+                continue
+            for channel_name in self.channel_names:
+                channel = discord.utils.get(category.text_channels, name=channel_name)
+                if channel is None:
+                    continue
+                self._channels[(guild.id, channel_name)] = channel
+                self._by_name[channel_name].append(channel)
+        self.stale = False
+
+    def invalidate(self, guilds=None):
+        if guilds is not None:
+            self.guilds = list(guilds)
+        self.stale = True
+
+    def _ensure_resolved(self):
+        if self.stale:
+            self.resolve(self.guilds)
+
+    def get(self, guild, channel_name):
+        self._ensure_resolved()
+        return self._channels.get((guild.id, channel_name))
+
+    def channels_named(self, channel_name):
+        self._ensure_resolved()
+        return self._by_name.get(channel_name, [])
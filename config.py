@@ -1,8 +1,10 @@
+import os
 import pathlib
 import json
 
 _config_dir = pathlib.Path(__file__).parent.resolve()
-_config_path = f"{_config_dir}/config.json"
+# MCDS_CONFIG points at an alternate config, e.g. the one replay.py generates to run against a recorded log.
+_config_path = os.environ.get("MCDS_CONFIG", f"{_config_dir}/config.json")
 
 class _Config:
     def __init__(self, config_path):
@@ -27,6 +29,10 @@ class _Config:
         if "category" in self._config:
             self.category = self._config["category"]
 
+        self.command_pacing_seconds = 0.0
+        if "command_pacing_seconds" in self._config:
+            self.command_pacing_seconds = self._config["command_pacing_seconds"]
+
         self.shutdown_command = None
         if "shutdown_command" in self._config:
             self.shutdown_command = self._config["shutdown_command"]
@@ -48,4 +54,84 @@ class _Config:
         if "flow_alias_id" in self._config:
             self.flow_alias_id = self._config["flow_alias_id"]
 
+        # A flow served over HTTP (see bedrock.HttpFlowBackend) can be used for God in place of Bedrock.
+        self.god_flow_url = None
+        if "god_flow_url" in self._config:
+            self.god_flow_url = self._config["god_flow_url"]
+
+        self.god_timeout_seconds = 30
+        if "god_timeout_seconds" in self._config:
+            self.god_timeout_seconds = self._config["god_timeout_seconds"]
+
+        self.god_max_concurrency = 2
+        if "god_max_concurrency" in self._config:
+            self.god_max_concurrency = self._config["god_max_concurrency"]
+
+        # How many characters of server history God is given as context.
+        self.god_context_chars = 6000
+        if "god_context_chars" in self._config:
+            self.god_context_chars = self._config["god_context_chars"]
+
+        # When set, trigger objectives are registered by a datapack generated in this world directory rather than by
+        # console commands.
+        self.world_path = None
+        if "world_path" in self._config:
+            self.world_path = self._config["world_path"]
+
+        self.datapack_pack_format = 48
+        if "datapack_pack_format" in self._config:
+            self.datapack_pack_format = self._config["datapack_pack_format"]
+
+        # logs/log.txt is rotated when it reaches log_max_bytes or is log_rotate_seconds old, keeping log_backup_count
+        # rotated files (gzipped if log_compress).
+        self.log_max_bytes = 10 * 1024 * 1024
+        if "log_max_bytes" in self._config:
+            self.log_max_bytes = self._config["log_max_bytes"]
+
+        self.log_rotate_seconds = 24 * 60 * 60
+        if "log_rotate_seconds" in self._config:
+            self.log_rotate_seconds = self._config["log_rotate_seconds"]
+
+        self.log_backup_count = 10
+        if "log_backup_count" in self._config:
+            self.log_backup_count = self._config["log_backup_count"]
+
+        self.log_compress = True
+        if "log_compress" in self._config:
+            self.log_compress = self._config["log_compress"]
+
+        # Console output is archived here (compressed and indexed, see console_archive.py) for `!logs`. null disables it.
+        self.console_archive_dir = "logs/console"
+        if "console_archive_dir" in self._config:
+            self.console_archive_dir = self._config["console_archive_dir"]
+
+        self.console_archive_max_bytes = 1024 * 1024 * 1024
+        if "console_archive_max_bytes" in self._config:
+            self.console_archive_max_bytes = self._config["console_archive_max_bytes"]
+
+        # The event loop is reported as blocked (with the blocking stack) when it stalls for longer than this. With
+        # loop_lag_profile, the stall is also sampled and a profile logged when it ends.
+        self.loop_lag_threshold_seconds = 0.5
+        if "loop_lag_threshold_seconds" in self._config:
+            self.loop_lag_threshold_seconds = self._config["loop_lag_threshold_seconds"]
+
+        self.loop_lag_profile = False
+        if "loop_lag_profile" in self._config:
+            self.loop_lag_profile = self._config["loop_lag_profile"]
+
+        # The server is declared dead (and the machine shut down) after this many consecutive failed liveness checks.
+        self.liveness_failures = 3
+        if "liveness_failures" in self._config:
+            self.liveness_failures = self._config["liveness_failures"]
+
+        # When set, liveness checks also ping the server on this local port, like the multiplayer screen does.
+        self.server_ping_port = None
+        if "server_ping_port" in self._config:
+            self.server_ping_port = self._config["server_ping_port"]
+
+        # When set, metrics are served in the Prometheus text format on this local port.
+        self.metrics_port = None
+        if "metrics_port" in self._config:
+            self.metrics_port = self._config["metrics_port"]
+
 Config = _Config(_config_path)
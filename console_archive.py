@@ -0,0 +1,287 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ArchiveBlock:
+    """
+    One gzip member of a segment: a batch of lines, with the time range and event types it covers.
+    """
+
+    def __init__(self, segment, offset, length, start, end, events):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.start = start
+        self.end = end
+        self.events = set(events)
+
+    def to_json(self):
+        return json.dumps({
+            "segment": self.segment,
+            "offset": self.offset,
+            "length": self.length,
+            "start": self.start,
+            "end": self.end,
+            "events": sorted(self.events),
+        })
+
+    @staticmethod
+    def from_json(line):
+        block = json.loads(line)
+        return ArchiveBlock(
+            block["segment"], block["offset"], block["length"], block["start"], block["end"], block["events"]
+        )
+
+
+class ConsoleArchive:
+    """
+    An append-only, compressed archive of the server console, indexed by time and event type.
+
+    Lines are collected in memory and written by run() every few seconds as one gzip member appended to the current
+    segment file. Segments are therefore ordinary (multi-member) .gz files that zcat can read. Each line is stored as
+    `<unix time> <event types parsed from it, comma separated, or -> <line>`. Every member gets an entry in index.jsonl
+    with its byte range, time range and the event types parsed from its lines, so a search only decompresses the
+    members that can match, and then checks each line's own event types. The oldest segments are deleted once the
+    archive exceeds max_bytes.
+
+    Writes run on one worker thread and searches on another, so neither blocks the event loop and a slow search never
+    holds up writes. Searches only read members that are already in the index, and give up after time_limit seconds.
+    """
+
+    INDEX_FILE = "index.jsonl"
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+
+        self.pending = []
+        self.blocks = []
+        self.segment = None
+        self.segment_size = 0
+        self.closed = False
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="console-archive")
+        self.search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="console-archive-search")
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILE)) as index_file:
+                self.blocks = [ArchiveBlock.from_json(line) for line in index_file if line.strip()]
+        except FileNotFoundError:
+            self.blocks = []
+        except (OSError, ValueError, KeyError) as e:
+            logging.exception(e)
+            self.blocks = []
+        # Always start a new segment, in case the last one was cut short.
+        self.segment = None
+
+    def append(self, line: bytes, events=()):
+        # The server can still print after close() (it runs before the shutdown script); those lines are dropped.
+        if self.closed:
+            return
+        self.pending.append((time.time(), line, tuple(type(event).__name__ for event in events)))
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, segment)
+
+    def _write(self, lines):
+        if self.segment is None or self.segment_size >= self.segment_bytes:
+            self.segment = f"console-{int(lines[0][0])}.log.gz"
+            self.segment_size = 0
+
+        data = b"".join(
+            f"{line_time:.3f} {','.join(event_names) or '-'} ".encode() + line + b"\n"
+            for line_time, line, event_names in lines
+        )
+        member = gzip.compress(data)
+        path = self._segment_path(self.segment)
+        with open(path, "ab") as segment_file:
+            offset = segment_file.tell()
+            segment_file.write(member)
+        self.segment_size = offset + len(member)
+
+        events = {event_name for _, _, event_names in lines for event_name in event_names}
+        block = ArchiveBlock(self.segment, offset, len(member), lines[0][0], lines[-1][0], events)
+        self.blocks.append(block)
+        with open(os.path.join(self.directory, self.INDEX_FILE), "a") as index_file:
+            index_file.write(block.to_json() + "\n")
+
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        segments = []
+        for block in self.blocks:
+            if block.segment not in segments:
+                segments.append(block.segment)
+        sizes = {}
+        for segment in segments:
+            try:
+                sizes[segment] = os.path.getsize(self._segment_path(segment))
+            except OSError:
+                sizes[segment] = 0
+
+        total = sum(sizes.values())
+        removed = set()
+        for segment in segments:
+            if total <= self.max_bytes or segment == self.segment:
+                break
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+            total -= sizes[segment]
+            removed.add(segment)
+
+        if removed:
+            self.blocks = [block for block in self.blocks if block.segment not in removed]
+            index_path = os.path.join(self.directory, self.INDEX_FILE)
+            with open(index_path + ".tmp", "w") as index_file:
+                index_file.writelines(block.to_json() + "\n" for block in self.blocks)
+            os.replace(index_path + ".tmp", index_path)
+
+    async def flush(self):
+        if not self.pending:
+            return
+        lines = self.pending
+        self.pending = []
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._write, lines)
+        except OSError as e:
+            logging.exception(e)
+
+    async def run(self, interval=5):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def _search(self, since, pattern, event, limit_bytes, time_limit):
+        deadline = time.monotonic() + time_limit
+        event_name = event.encode() if event is not None else None
+        matches = []
+        size = 0
+        truncated = False
+        timed_out = False
+        for block in list(self.blocks):
+            if block.end < since:
+                continue
+            if event is not None and event not in block.events:
+                continue
+            try:
+                with open(self._segment_path(block.segment), "rb") as segment_file:
+                    segment_file.seek(block.offset)
+                    data = gzip.decompress(segment_file.read(block.length))
+            except (OSError, EOFError) as e:
+                logging.exception(e)
+                continue
+
+            for record in data.split(b"\n"):
+                if not record:
+                    continue
+                line_time, _, record = record.partition(b" ")
+                event_names, _, line = record.partition(b" ")
+                line_time = float(line_time)
+                if line_time < since:
+                    continue
+                if time.monotonic() > deadline:
+                    timed_out = True
+                    break
+                if event_name is not None and event_name not in event_names.split(b","):
+                    continue
+                line = line.decode(errors="replace")
+                if pattern is not None and not pattern.search(line):
+                    continue
+                match = f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(line_time))} {line}\n"
+                size += len(match)
+                if size > limit_bytes:
+                    truncated = True
+                    break
+                matches.append(match)
+            if truncated:
+                matches.append("[more matching lines were truncated]\n")
+                break
+            if timed_out:
+                stopped_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(line_time))
+                matches.append(f"[the search was stopped after {time_limit}s, at lines from {stopped_at}]\n")
+                break
+        return "".join(matches)
+
+    async def search(self, since, pattern=None, event=None, limit_bytes=8 * 1024 * 1024, time_limit=10):
+        """
+        Returns the archived lines since `since` (a unix time) matching the regex `pattern`, and that produced an
+        `event` (an event type name) if given. Lines still waiting to be written are flushed first. The search stops
+        at the first line after `time_limit` seconds, noting so in the result.
+        """
+        await self.flush()
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern, re.IGNORECASE)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.search_executor, self._search, since, pattern, event, limit_bytes, time_limit
+        )
+
+    async def close(self):
+        await self.flush()
+        self.closed = True
+        self.executor.shutdown(wait=True)
+        self.search_executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def parse_since(since, now=None):
+        """
+        Parses `30m`, `2h`, `1d` etc. (relative to now) or an absolute `YYYY-MM-DD` or `YYYY-MM-DDTHH:MM` local time
+        into a unix time. Returns None if it can't be parsed.
+        """
+        if now is None:
+            now = time.time()
+        match = re.fullmatch(r"([0-9]+)([smhd])", since)
+        if match:
+            unit = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}[match.group(2)]
+            return now - int(match.group(1)) * unit
+        for time_format in ("%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+            try:
+                return time.mktime(time.strptime(since, time_format))
+            except ValueError:
+                continue
+        return None
+
+
+if __name__ == '__main__':
+    # Write and search check: python3 console_archive.py
+    import tempfile
+
+    from mc_event import parser
+
+    async def main():
+        archive = ConsoleArchive(tempfile.mkdtemp(), segment_bytes=64 * 1024)
+        archive.load()
+        for i in range(20000):
+            line = f"[12:00:00] [Server thread/INFO]: <player{i % 50:03d}> message {i}"
+            if i % 1000 == 0:
+                line = f"[12:00:00] [Server thread/INFO]: player{i % 50:03d} left the game"
+            archive.append(line.encode(), parser.parse(line))
+            if i % 2000 == 1999:
+                await archive.flush()
+        await archive.flush()
+
+        start = time.perf_counter()
+        result = await archive.search(0, r"message 1234\b")
+        print(f"grep over {len(archive.blocks)} blocks: {(time.perf_counter() - start) * 1000:.1f}ms")
+        assert "message 1234" in result and result.count("\n") == 1, result
+
+        start = time.perf_counter()
+        result = await archive.search(0, event="PlayerLeave")
+        print(f"PlayerLeave lines: {result.count(chr(10))} in {(time.perf_counter() - start) * 1000:.1f}ms")
+        assert result.count("\n") == 20 and result.count("left the game") == 20, result
+        assert (await archive.search(0, r"player000\b", event="PlayerMessage")).count("\n") == 380
+        assert await archive.search(time.time() + 60) == ""
+        assert "the search was stopped" in await archive.search(0, "no such line", time_limit=0)
+        await archive.close()
+
+    asyncio.run(main())
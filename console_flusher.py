@@ -0,0 +1,99 @@
+import asyncio
+import gzip
+import logging
+import time
+from collections import deque
+
+
+class ConsoleFlusher:
+    """
+    Sends buffered console output to Discord, adapting to how fast the server is writing.
+
+    The flusher sleeps until the console buffer has data, then lingers briefly so the rest of a burst can land in the
+    same message. The linger shrinks toward min_linger while output is a trickle (so interactive commands echo quickly)
+    and grows toward max_linger during floods, when fewer, larger sends are better. A flush sends up to max_messages
+    code blocks, limited by the channel's remaining rate-limit budget. Past that the backlog goes out as one attachment,
+    gzipped once it's larger than gzip_threshold.
+    """
+
+    CODE_BLOCK = "```"
+    MESSAGE_CHAR_LIMIT = 2000 - 2 * len(CODE_BLOCK)
+
+    # Discord allows roughly 5 messages per 5 seconds per channel.
+    RATE_LIMIT_MESSAGES = 5
+    RATE_LIMIT_SECONDS = 5
+
+    def __init__(self, console_buffer, send_message, send_file,
+                 min_linger=0.1, max_linger=2.0, max_messages=3, gzip_threshold=256 * 1024):
+        self.console_buffer = console_buffer
+        self.send_message = send_message
+        self.send_file = send_file
+
+        self.min_linger = min_linger
+        self.max_linger = max_linger
+        self.linger = min_linger
+        self.max_messages = max_messages
+        self.gzip_threshold = gzip_threshold
+
+        self.send_times = deque()
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    def rate_limit_headroom(self):
+        now = time.monotonic()
+        while self.send_times and now - self.send_times[0] > self.RATE_LIMIT_SECONDS:
+            self.send_times.popleft()
+        return self.RATE_LIMIT_MESSAGES - len(self.send_times)
+
+    async def _wait_for_headroom(self):
+        while (headroom := self.rate_limit_headroom()) <= 0:
+            await asyncio.sleep(self.RATE_LIMIT_SECONDS - (time.monotonic() - self.send_times[0]))
+        return headroom
+
+    async def run(self):
+        while True:
+            await self.console_buffer.wait_for_data()
+            await asyncio.sleep(self.linger)
+            await self.flush()
+
+    async def flush(self):
+        dropped = self.console_buffer.take_dropped()
+        if dropped:
+            logging.info(f"console buffer overflowed, dropped {dropped} lines")
+            self.console_buffer.prepend(f"[{dropped} lines of console output were dropped]".encode("utf-8"))
+
+        if len(self.console_buffer) == 0:
+            return
+
+        latency = self.console_buffer.oldest_age()
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+
+        headroom = await self._wait_for_headroom()
+        message_budget = min(self.max_messages, headroom)
+        pending = self.console_buffer.size
+
+        # Lines too long for a single message would never fit in a chunk, so they go out with the rest as a file.
+        fits = pending <= message_budget * self.MESSAGE_CHAR_LIMIT
+        if fits and self.console_buffer.longest_line() <= self.MESSAGE_CHAR_LIMIT:
+            chunks = self.console_buffer.chunks(self.MESSAGE_CHAR_LIMIT, message_budget)
+            for chunk in chunks:
+                await self._send_message(self.CODE_BLOCK + chunk + self.CODE_BLOCK)
+            self.linger = max(self.min_linger, self.linger / 2)
+            return
+
+        logging.info(f"console flood: {pending} bytes pending, oldest line {latency:.2f}s old")
+        data = self.console_buffer.take_all()
+        if len(data) > self.gzip_threshold:
+            await self._send_file(gzip.compress(data), "server-data.txt.gz")
+        else:
+            await self._send_file(data, "server-data.txt")
+        self.linger = min(self.max_linger, self.linger * 2)
+
+    async def _send_message(self, message):
+        self.send_times.append(time.monotonic())
+        await self.send_message(message)
+
+    async def _send_file(self, data, file_name):
+        self.send_times.append(time.monotonic())
+        await self.send_file(data, file_name)
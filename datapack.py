@@ -0,0 +1,76 @@
+import hashlib
+import json
+import pathlib
+
+
+class ObjectivesDatapack:
+    """
+    A generated datapack that registers and enables the trigger objectives in-game.
+
+    Its load function adds every objective, and its tick function runs a per-player enable function once for each player
+    that hasn't been enabled for the current objective set (tracked with a tag derived from the set's digest). This
+    replaces registering every objective and enabling every objective for every joining player over the console.
+
+    Functions and tags are written under both the singular (1.21+) and plural (older) directory names so the pack works
+    on either side of the rename.
+    """
+
+    NAMESPACE = "mc_discord_sync"
+
+    def __init__(self, world_path, pack_format):
+        self.path = pathlib.Path(world_path) / "datapacks" / self.NAMESPACE
+        self.pack_format = pack_format
+
+    @staticmethod
+    def digest(objectives):
+        return hashlib.sha1("\n".join(sorted(objectives)).encode("utf-8")).hexdigest()[:12]
+
+    def _description(self, digest):
+        return f"mc-discord-sync trigger objectives ({digest})"
+
+    def is_current(self, objectives):
+        try:
+            pack = json.loads((self.path / "pack.mcmeta").read_text())
+        except (OSError, ValueError):
+            return False
+        return pack.get("pack", {}).get("description") == self._description(self.digest(objectives))
+
+    def write_if_changed(self, objectives):
+        """
+        Writes the datapack if the objective set differs from the one already on disk. Returns whether it was written.
+        """
+        if self.is_current(objectives):
+            return False
+
+        digest = self.digest(objectives)
+        tag = f"mcds_{digest}"
+        objectives = sorted(objectives)
+
+        files = {
+            "pack.mcmeta": json.dumps({
+                "pack": {
+                    "pack_format": self.pack_format,
+                    "supported_formats": {"min_inclusive": 10, "max_inclusive": 1000},
+                    "description": self._description(digest),
+                }
+            }, indent=2),
+        }
+
+        functions = {
+            "load": [f"scoreboard objectives add {objective} trigger" for objective in objectives],
+            "tick": [f"execute as @a[tag=!{tag}] run function {self.NAMESPACE}:enable"],
+            "enable": [f"scoreboard players enable @s {objective}" for objective in objectives] + [f"tag @s add {tag}"],
+        }
+        for directory in ("function", "functions"):
+            for name, commands in functions.items():
+                files[f"data/{self.NAMESPACE}/{directory}/{name}.mcfunction"] = "\n".join(commands) + "\n"
+            for name in ("load", "tick"):
+                files[f"data/minecraft/tags/{directory}/{name}.json"] = json.dumps({
+                    "values": [f"{self.NAMESPACE}:{name}"]
+                })
+
+        for relative_path, content in files.items():
+            path = self.path / relative_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+        return True
@@ -0,0 +1,103 @@
+import csv
+import os
+
+
+class Emote:
+    def __init__(self, command, local_general, local_target, global_general, global_target):
+        self.command = command
+        self.local_general = local_general
+        self.local_target = local_target
+        self.global_general = global_general
+        self.global_target = global_target
+
+    def local_general_message(self):
+        return self.local_general
+
+    def local_target_message(self, target):
+        return self.local_target.replace("(Target)", target)
+
+    def global_general_message(self, player):
+        return self.global_general.replace("(Player)", player)
+
+    def global_target_message(self, player, target):
+        return self.global_target.replace("(Player)", player).replace("(Target)", target)
+
+
+class EmoteTable:
+    """
+    The emotes defined in an emotes CSV, loaded once and reloaded only when the file's mtime changes.
+
+    Rendering stays a str.replace per placeholder: on templates this short that measured faster than splitting them
+    into segments to join, or str.format.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.emotes = {}
+
+    def __contains__(self, command):
+        return command in self.emotes
+
+    def __getitem__(self, command):
+        return self.emotes[command]
+
+    def __iter__(self):
+        return iter(self.emotes)
+
+    def reload_if_changed(self):
+        """
+        Reloads the table if the file changed since it was last loaded. Returns the (added, removed) commands.
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return set(), set()
+
+        emotes = {}
+        with open(self.path) as emote_file:
+            for row in csv.reader(emote_file):
+                if len(row) < 5:
+                    continue
+                command, local_general, local_target, global_general, global_target = row[:5]
+                emotes[command] = Emote(command, local_general, local_target, global_general, global_target)
+
+        added = emotes.keys() - self.emotes.keys()
+        removed = self.emotes.keys() - emotes.keys()
+        self.emotes = emotes
+        self.mtime = mtime
+        return added, removed
+
+
+if __name__ == '__main__':
+    # Benchmark of emote rendering and reloading over the full emote set: python3 emotes.py
+    import json
+    import pathlib
+    import time
+
+    table = EmoteTable(f"{pathlib.Path(__file__).parent.resolve()}/emotes.csv")
+    table.reload_if_changed()
+
+    def render():
+        for command in table:
+            table[command].global_target_message("goatgoose1142", "someone_else")
+
+    def trigger():
+        for command in table:
+            message = table[command].global_target_message("goatgoose1142", "someone_else")
+            f"tellraw @a {json.dumps([{'text': message}])}"
+
+    def reload():
+        table.mtime = None
+        table.reload_if_changed()
+
+    for name, run, rounds, per_round in [
+        ("render", render, 2000, len(table.emotes)),
+        ("trigger to tellraw", trigger, 2000, len(table.emotes)),
+        ("unchanged check", table.reload_if_changed, 2000, 1),
+        ("reload", reload, 200, 1),
+    ]:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            run()
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {elapsed / (rounds * per_round) * 1e6:.2f}us ({len(table.emotes)} emotes)")
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import time
+
+from metrics import registry
+
+HANDLER_SECONDS = registry.histogram("mcds_event_handler_seconds", "Time spent in an event's handler", label="event")
+
+
+class EventBus:
+    """
+    Delivers events to their handlers from a small, fixed set of consumer coroutines.
+
+    Each event type is assigned to a lane, and each lane has its own bounded queue and consumer. Events in a lane are
+    handled one at a time in the order they were published, so event types that share a lane (e.g. PlayerJoin and
+    PlayerLeave) are handled in log order. Publishing waits when a lane's queue is full, which pushes back on the log
+    reader instead of growing without bound.
+    """
+
+    DEFAULT_LANE = "default"
+
+    def __init__(self, maxsize=1024, batch_size=64):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+
+        self.handlers = {}
+        self.lanes = {}
+        self.queues = {}
+
+    def subscribe(self, event_type, handler, lane=DEFAULT_LANE):
+        self.handlers[event_type] = handler
+        self.lanes[event_type] = lane
+        if lane not in self.queues:
+            self.queues[lane] = asyncio.Queue(maxsize=self.maxsize)
+
+    async def publish(self, event):
+        lane = self.lanes.get(type(event))
+        if lane is None:
+            return
+        await self.queues[lane].put(event)
+
+    def depth(self):
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    async def run(self):
+        await asyncio.gather(*[
+            self._consume(queue) for queue in self.queues.values()
+        ])
+
+    async def _consume(self, queue):
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            for event in batch:
+                start = time.perf_counter()
+                try:
+                    await self.handlers[type(event)](event)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.exception(e)
+                finally:
+                    queue.task_done()
+                    HANDLER_SECONDS.observe(time.perf_counter() - start, type(event).__name__)
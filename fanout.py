@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from io import BytesIO
+
+import discord
+
+from metrics import registry
+
+SEND_SECONDS = registry.histogram("mcds_discord_send_seconds", "Latency of successful Discord sends")
+SEND_RETRIES = registry.counter("mcds_discord_send_retries_total", "Discord sends retried")
+SEND_FAILURES = registry.counter("mcds_discord_send_failures_total", "Discord sends that failed after retrying")
+
+
+class GuildSendStats:
+    def __init__(self):
+        self.sends = 0
+        self.failures = 0
+        self.retries = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def average_latency(self):
+        if self.sends == 0:
+            return 0.0
+        return self.total_latency / self.sends
+
+
+class FanOutSender:
+    """
+    Sends one message to a channel in every guild concurrently.
+
+    Each guild's send has its own timeout and retry/backoff, so a slow or failing guild only delays itself: the total
+    latency of a fan-out tracks the slowest guild rather than the sum of all of them. Per-guild latency and failure
+    counts are kept in `stats`, keyed by guild id.
+    """
+
+    def __init__(self, timeout=10.0, retries=2, backoff=0.5):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = {}
+
+    async def send(self, channels, content=None, file=None):
+        """
+        Sends to every channel and returns how many sends succeeded. `file` is an optional (data, file_name) tuple; a
+        fresh discord.File is built for each attempt since sending consumes it.
+        """
+        results = await asyncio.gather(*[
+            self._send_one(channel, content, file) for channel in channels
+        ])
+        return sum(results)
+
+    @staticmethod
+    def _retryable(exception):
+        if isinstance(exception, discord.HTTPException):
+            return exception.status >= 500 or exception.status == 429
+        return isinstance(exception, (OSError, asyncio.TimeoutError))
+
+    async def _send_one(self, channel, content, file):
+        stats = self.stats.setdefault(channel.guild.id, GuildSendStats())
+        for attempt in range(self.retries + 1):
+            start = time.monotonic()
+            try:
+                kwargs = {}
+                if content is not None:
+                    kwargs["content"] = content
+                if file is not None:
+                    data, file_name = file
+                    kwargs["file"] = discord.File(BytesIO(data), file_name)
+                await asyncio.wait_for(channel.send(**kwargs), self.timeout)
+            except (discord.DiscordException, OSError, asyncio.TimeoutError) as e:
+                if attempt == self.retries or not self._retryable(e):
+                    stats.failures += 1
+                    SEND_FAILURES.inc()
+                    logging.warning(f"send to {channel.guild} #{channel} failed: {e!r}")
+                    return False
+                stats.retries += 1
+                SEND_RETRIES.inc()
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+                continue
+
+            latency = time.monotonic() - start
+            stats.sends += 1
+            stats.last_latency = latency
+            stats.max_latency = max(stats.max_latency, latency)
+            stats.total_latency += latency
+            SEND_SECONDS.observe(latency)
+            return True
+        return False
+
+
+if __name__ == '__main__':
+    # Fan-out check against fake channels with artificial delays: the total should track the slowest guild.
+    class FakeGuild:
+        def __init__(self, id_):
+            self.id = id_
+
+        def __str__(self):
+            return f"guild-{self.id}"
+
+    class FakeChannel:
+        def __init__(self, guild, delay):
+            self.guild = guild
+            self.delay = delay
+            self.sent = []
+
+        def __str__(self):
+            return "chat-sync"
+
+        async def send(self, content=None, file=None):
+            await asyncio.sleep(self.delay)
+            self.sent.append(content)
+
+    async def main():
+        delays = [0.05, 0.1, 0.2, 0.4]
+        channels = [FakeChannel(FakeGuild(i), delay) for i, delay in enumerate(delays)]
+        sender = FanOutSender()
+
+        start = time.monotonic()
+        sent = await sender.send(channels, content="hello")
+        elapsed = time.monotonic() - start
+
+        print(f"sent to {sent} guilds in {elapsed:.3f}s (slowest {max(delays)}s, sum {sum(delays)}s)")
+        for guild_id, stats in sender.stats.items():
+            print(f"  guild-{guild_id}: {stats.last_latency:.3f}s")
+        assert sent == len(channels)
+        assert elapsed < max(delays) + 0.1
+
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class GodScheduler:
+    """
+    Sits in front of God to keep repeated or spammed questions from each becoming a paid flow call.
+
+    - Questions are normalized (case, punctuation, whitespace) before comparison.
+    - Answers are cached (LRU with a TTL) by normalized question plus a digest of the context, so asking the same
+      thing again about the same situation is answered instantly.
+    - A question matching one asked within `coalesce_window` seconds shares that request rather than starting another;
+      the shared reply is only returned to the first asker, since it's broadcast to everyone anyway.
+    - Each player, and all players together, are rate limited with token buckets.
+
+    ask() returns None when a question was coalesced, and RATE_LIMITED when it was rate limited, so the asker can be
+    told to try again.
+    """
+
+    RATE_LIMITED = object()
+
+    def __init__(self, god, alias, coalesce_window=15, cache_size=128, cache_ttl=10 * 60,
+                 player_rate=1 / 20, player_burst=3, global_rate=1 / 5, global_burst=5):
+        self.god = god
+        self.reply_prefix = self.normalize(f"{alias} says")
+        self.coalesce_window = coalesce_window
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.player_rate = player_rate
+        self.player_burst = player_burst
+
+        self.cache = OrderedDict()
+        self.recent = {}
+        self.player_buckets = {}
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.calls = 0
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+    def context_digest(self, normalized_question, context):
+        # Repeats of the question and God's own replies are left out, so neither asking nor answering a question
+        # changes its cache key.
+        digest = hashlib.sha1()
+        for entry in context.splitlines():
+            normalized_entry = self.normalize(entry)
+            if normalized_question in normalized_entry or normalized_entry.startswith(self.reply_prefix):
+                continue
+            digest.update(entry.encode("utf-8"))
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def hit_rate(self):
+        if self.requests == 0:
+            return 0.0
+        return self.cache_hits / self.requests
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "hit_rate": self.hit_rate(),
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "calls": self.calls,
+            "average_queue_wait": self.god.average_queue_wait(),
+        }
+
+    def _cached(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        expires, reply = entry
+        if time.monotonic() > expires:
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return reply
+
+    def _cache(self, key, reply):
+        self.cache[key] = (time.monotonic() + self.cache_ttl, reply)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _rate_limited(self, requester):
+        bucket = self.player_buckets.get(requester)
+        if bucket is None:
+            bucket = self.player_buckets[requester] = TokenBucket(self.player_rate, self.player_burst)
+        return not (bucket.try_take() and self.global_bucket.try_take())
+
+    async def ask(self, requester, question, context, on_partial=None):
+        self.requests += 1
+        normalized = self.normalize(question)
+        key = (normalized, self.context_digest(normalized, context))
+
+        reply = self._cached(key)
+        if reply is not None:
+            self.cache_hits += 1
+            return reply
+
+        recent = self.recent.get(normalized)
+        if recent is not None and time.monotonic() - recent < self.coalesce_window:
+            self.coalesced += 1
+            return None
+
+        if self._rate_limited(requester):
+            self.rate_limited += 1
+            return self.RATE_LIMITED
+
+        self.recent[normalized] = time.monotonic()
+        self.calls += 1
+        try:
+            reply = await self.god.ask(requester, question, context, on_partial=on_partial)
+        finally:
+            now = time.monotonic()
+            self.recent = {
+                question_: asked for question_, asked in self.recent.items()
+                if now - asked < self.coalesce_window
+            }
+
+        self._cache(key, reply)
+        return reply
@@ -0,0 +1,114 @@
+import asyncio
+import contextlib
+import logging
+import secrets
+import sqlite3
+import time
+
+
+class IdentityLinks:
+    """
+    Links between Minecraft usernames and Discord user ids.
+
+    Every link is held in memory in two dicts, so lookups in either direction are O(1) and never touch the disk.
+    SQLite is only the persistent copy: changes are collected in memory and written in batches from a worker thread by
+    run(), so the chat path never blocks on I/O.
+    """
+
+    CODE_TTL_SECONDS = 5 * 60
+
+    def __init__(self, path):
+        self.path = path
+        self.by_player = {}
+        self.by_discord = {}
+        self.pending_writes = {}
+        self.pending_codes = {}
+
+    def load(self):
+        # sqlite3's connection context manager only commits or rolls back; closing() closes the connection too.
+        with contextlib.closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS links (discord_id INTEGER PRIMARY KEY, username TEXT NOT NULL)"
+            )
+            for discord_id, username in connection.execute("SELECT discord_id, username FROM links"):
+                self.by_discord[discord_id] = username
+                self.by_player[username.lower()] = discord_id
+
+    def player_for(self, discord_id):
+        return self.by_discord.get(discord_id)
+
+    def discord_for(self, username):
+        return self.by_player.get(username.lower())
+
+    def link(self, discord_id, username):
+        self.unlink(discord_id)
+        previous_discord_id = self.by_player.get(username.lower())
+        if previous_discord_id is not None:
+            self.unlink(previous_discord_id)
+
+        self.by_discord[discord_id] = username
+        self.by_player[username.lower()] = discord_id
+        self.pending_writes[discord_id] = username
+
+    def unlink(self, discord_id):
+        username = self.by_discord.pop(discord_id, None)
+        if username is None:
+            return None
+        self.by_player.pop(username.lower(), None)
+        self.pending_writes[discord_id] = None
+        return username
+
+    def start_link(self, discord_id, username):
+        """
+        Starts linking `discord_id` to `username`, returning a code that the player must say in Minecraft chat.
+        """
+        now = time.monotonic()
+        self.pending_codes = {
+            code: pending for code, pending in self.pending_codes.items() if pending[2] > now
+        }
+        code = f"{secrets.randbelow(1000000):06d}"
+        self.pending_codes[code] = (discord_id, username, now + self.CODE_TTL_SECONDS)
+        return code
+
+    def complete_link(self, username, code):
+        """
+        Completes a link started by start_link() if `username` said a valid code. Returns the linked Discord id.
+        """
+        pending = self.pending_codes.get(code)
+        if pending is None:
+            return None
+        discord_id, expected_username, expires = pending
+        if expires < time.monotonic() or expected_username.lower() != username.lower():
+            return None
+
+        del self.pending_codes[code]
+        self.link(discord_id, username)
+        return discord_id
+
+    def _write(self, writes):
+        with contextlib.closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO links (discord_id, username) VALUES (?, ?)",
+                [(discord_id, username) for discord_id, username in writes.items() if username is not None]
+            )
+            connection.executemany(
+                "DELETE FROM links WHERE discord_id = ?",
+                [(discord_id,) for discord_id, username in writes.items() if username is None]
+            )
+
+    async def flush(self):
+        if not self.pending_writes:
+            return
+        writes = self.pending_writes
+        self.pending_writes = {}
+        try:
+            await asyncio.to_thread(self._write, writes)
+        except sqlite3.Error as e:
+            logging.exception(e)
+            # keep the writes for the next flush, unless they've been superseded since
+            self.pending_writes = {**writes, **self.pending_writes}
+
+    async def run(self, interval=5):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
@@ -0,0 +1,115 @@
+import time
+from collections import deque, Counter
+
+
+class JournalEntry:
+    def __init__(self, kind, actor, text):
+        self.time = time.time()
+        self.kind = kind
+        self.actor = actor
+        self.line = f"> {text}\n"
+
+
+class JournalSummary:
+    """
+    A running, structured summary of journal entries that no longer fit in the journal's budget.
+    """
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.chat = Counter()
+        self.joined = []
+        self.left = []
+        self.other = Counter()
+        self._text = ""
+
+    def absorb(self, entry):
+        if self.start is None:
+            self.start = entry.time
+        self.end = entry.time
+
+        if entry.kind in ("PlayerMessage", "ServerMessage") and entry.actor is not None:
+            self.chat[entry.actor] += 1
+        elif entry.kind == "PlayerJoin":
+            if entry.actor not in self.joined:
+                self.joined.append(entry.actor)
+        elif entry.kind == "PlayerLeave":
+            if entry.actor not in self.left:
+                self.left.append(entry.actor)
+        else:
+            self.other[entry.kind] += 1
+        self._text = None
+
+    @staticmethod
+    def _names(names, limit=10):
+        if len(names) <= limit:
+            return ", ".join(names)
+        return f"{', '.join(names[:limit])} and {len(names) - limit} others"
+
+    def text(self):
+        if self._text is None:
+            start = time.strftime("%H:%M", time.localtime(self.start))
+            end = time.strftime("%H:%M", time.localtime(self.end))
+            parts = []
+            if self.joined:
+                parts.append(f"{self._names(self.joined)} joined")
+            if self.left:
+                parts.append(f"{self._names(self.left)} left")
+            if self.chat:
+                speakers = ", ".join(f"{actor} {count}" for actor, count in self.chat.most_common(10))
+                parts.append(f"{sum(self.chat.values())} chat messages ({speakers})")
+            for kind, count in self.other.most_common(5):
+                parts.append(f"{count} {kind} events")
+            self._text = f"> Summary of earlier events ({start}-{end}): {'; '.join(parts)}.\n"
+        return self._text
+
+
+class Journal:
+    """
+    A record of server events for building God's context, bounded by a character budget rather than a fixed count.
+
+    Each event is recorded by its describe() text. Recent entries are kept verbatim; once they exceed the budget, the
+    oldest entries are folded into a running summary, so long sessions keep useful context without the prompt growing.
+    The verbatim segment is maintained incrementally and the summary text is cached, so assembling the context doesn't
+    rebuild it from scratch.
+    """
+
+    def __init__(self, char_budget=6000):
+        self.char_budget = char_budget
+
+        self.entries = deque()
+        self.chars = 0
+        self.summary = JournalSummary()
+        self._segment = ""
+
+    def record(self, event):
+        text = event.describe()
+        if text is None:
+            return
+        self.record_text(text, type(event).__name__, getattr(event, "username", None))
+
+    def record_text(self, text, kind="Note", actor=None):
+        entry = JournalEntry(kind, actor, text)
+        self.entries.append(entry)
+        self.chars += len(entry.line)
+        self._segment += entry.line
+
+        evicted = 0
+        while self.entries and self.chars + self._summary_chars() > self.char_budget:
+            oldest = self.entries.popleft()
+            self.chars -= len(oldest.line)
+            evicted += len(oldest.line)
+            self.summary.absorb(oldest)
+        if evicted:
+            self._segment = self._segment[evicted:]
+
+    def _summary_chars(self):
+        if self.summary.start is None:
+            return 0
+        return len(self.summary.text())
+
+    def context(self):
+        if self.summary.start is None:
+            return self._segment
+        return self.summary.text() + self._segment
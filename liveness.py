@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import struct
+import time
+
+from mc_event import List, TickQuery
+from metrics import registry
+
+LIST_RTT_SECONDS = registry.histogram("mcds_list_rtt_seconds", "Round trip of the liveness `list` query")
+PING_RTT_SECONDS = registry.histogram("mcds_ping_rtt_seconds", "Round trip of the liveness server list ping")
+LIVENESS_FAILURES = registry.counter("mcds_liveness_failures_total", "Liveness checks that found no sign of life")
+
+
+def _varint(value):
+    data = b""
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data += bytes([byte | 0x80])
+        else:
+            return data + bytes([byte])
+
+
+async def _read_varint(reader):
+    value = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value
+    raise ValueError("varint is too long")
+
+
+async def server_list_ping(host, port, timeout=5):
+    """
+    Asks the server for its status the way the multiplayer screen does, returning the round trip in seconds and the
+    parsed status.
+    """
+    async def ping():
+        start = time.monotonic()
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            host_bytes = host.encode("utf-8")
+            # handshake (protocol version, address, port, next state = status), then a status request
+            handshake = (
+                _varint(0x00) + _varint(767) + _varint(len(host_bytes)) + host_bytes + struct.pack(">H", port)
+                + _varint(1)
+            )
+            writer.write(_varint(len(handshake)) + handshake + _varint(1) + _varint(0x00))
+            await writer.drain()
+
+            length = await _read_varint(reader)
+            packet = await reader.readexactly(length)
+            rtt = time.monotonic() - start
+        finally:
+            writer.close()
+
+        # packet id, then the status JSON as a varint-prefixed string
+        offset = 1
+        json_length = 0
+        for i in range(5):
+            byte = packet[offset]
+            offset += 1
+            json_length |= (byte & 0x7F) << (7 * i)
+            if not byte & 0x80:
+                break
+        return rtt, json.loads(packet[offset:offset + json_length])
+
+    return await asyncio.wait_for(ping(), timeout)
+
+
+class LivenessCheck:
+    def __init__(self):
+        self.exited = False
+        self.output_age = None
+        self.list_rtt = None
+        self.ping_rtt = None
+
+    def alive(self, window):
+        if self.exited:
+            return False
+        return (
+            self.output_age is not None and self.output_age < window
+            or self.list_rtt is not None
+            or self.ping_rtt is not None
+        )
+
+    def describe(self):
+        parts = []
+        if self.output_age is not None:
+            parts.append(f"output {self.output_age:.0f}s ago")
+        parts.append(f"list {self.list_rtt * 1000:.0f}ms" if self.list_rtt is not None else "list timed out")
+        if self.ping_rtt is not None:
+            parts.append(f"ping {self.ping_rtt * 1000:.0f}ms")
+        return ", ".join(parts)
+
+
+class LivenessMonitor:
+    """
+    Decides whether the server is still alive from several signals rather than from output alone.
+
+    A check looks at whether the process has exited, how long ago it last printed anything, whether it answers a `list`
+    query (and how quickly), and optionally whether it answers a server list ping. The server counts as alive if its
+    process is running and any of the other signals shows life, so a quiet server or a slow world save isn't mistaken
+    for a dead one. Only `failures_to_fail` consecutive failed checks declare it dead, unless the process has exited,
+    which is conclusive. All timing is monotonic.
+
+    After the event loop has stalled, output and query responses may only have been waiting to be read, so a check
+    with stalled=True leaves them out. It's still DEAD if the process has exited and HEALTHY if the ping answers, but
+    otherwise UNKNOWN, which doesn't count as a failure.
+
+    It also samples the server's tick rate with `tick query` where the server supports it.
+    """
+
+    HEALTHY = "healthy"
+    WARNING = "warning"
+    DEAD = "dead"
+    UNKNOWN = "unknown"
+
+    TICK_QUERY_MAX_MISSES = 3
+
+    def __init__(self, mc_process, failures_to_fail=3, ping_port=None, query_timeout=10):
+        self.mc_process = mc_process
+        self.failures_to_fail = failures_to_fail
+        self.ping_port = ping_port
+        self.query_timeout = query_timeout
+
+        self.failures = 0
+        self.last_check = None
+
+        self.tick_query_misses = 0
+        self.tps = None
+        self.mspt = None
+        registry.gauge("mcds_server_tps", "Server ticks per second, from `tick query`", lambda: self.tps or 0.0)
+        registry.gauge("mcds_server_mspt", "Server milliseconds per tick, from `tick query`", lambda: self.mspt or 0.0)
+
+    def _exited(self):
+        process = self.mc_process.process
+        return process is not None and process.returncode is not None
+
+    async def check(self, window, query=True, stalled=False):
+        """
+        Runs one check and returns the resulting state (HEALTHY, WARNING, DEAD or UNKNOWN). `window` is how recently
+        the server must have printed something for output alone to count as a sign of life.
+        """
+        check = LivenessCheck()
+        check.exited = self._exited()
+        if not stalled:
+            check.output_age = self.mc_process.heartbeat.seconds_since_last_seen()
+
+        if not check.exited and (query or stalled):
+            probes = []
+            if query and not stalled:
+                probes.append(self._query_list(check))
+            if self.ping_port is not None:
+                probes.append(self._ping(check))
+            await asyncio.gather(*probes)
+            check.exited = self._exited()
+        self.last_check = check
+
+        if stalled and not check.exited and not check.alive(window):
+            return self.UNKNOWN
+        if check.alive(window):
+            if self.failures:
+                logging.info(f"server is responding again after {self.failures} failed checks ({check.describe()})")
+            self.failures = 0
+            return self.HEALTHY
+
+        self.failures += 1
+        LIVENESS_FAILURES.inc()
+        if check.exited:
+            logging.warning(f"server process exited with {self.mc_process.process.returncode}")
+            return self.DEAD
+        logging.warning(f"liveness check failed ({self.failures}/{self.failures_to_fail}): {check.describe()}")
+        if self.failures >= self.failures_to_fail:
+            return self.DEAD
+        return self.WARNING
+
+    async def _query_list(self, check):
+        start = time.monotonic()
+        try:
+            await self.mc_process.query("list", expect=List, timeout=self.query_timeout)
+        except asyncio.TimeoutError:
+            return
+        check.list_rtt = time.monotonic() - start
+        LIST_RTT_SECONDS.observe(check.list_rtt)
+
+    async def _ping(self, check):
+        try:
+            check.ping_rtt, _ = await server_list_ping("127.0.0.1", self.ping_port, self.query_timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            logging.info(f"server list ping failed: {e!r}")
+            return
+        PING_RTT_SECONDS.observe(check.ping_rtt)
+
+    async def sample_ticks(self):
+        """
+        Samples TPS/MSPT with `tick query`. Returns whether a sample was taken. Servers older than 1.20.3 don't have
+        the command, so sampling stops after a few queries in a row go unanswered.
+        """
+        if self.tick_query_misses >= self.TICK_QUERY_MAX_MISSES:
+            return False
+        try:
+            tick_query = await self.mc_process.query("tick query", expect=TickQuery, timeout=self.query_timeout)
+        except asyncio.TimeoutError:
+            self.tick_query_misses += 1
+            if self.tick_query_misses >= self.TICK_QUERY_MAX_MISSES:
+                logging.info("tick query went unanswered, no longer sampling the tick rate")
+            return False
+        self.tick_query_misses = 0
+        self.tps = tick_query.tps
+        self.mspt = tick_query.mspt
+        return True
@@ -0,0 +1,132 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from metrics import registry
+
+LOOP_LAG_SECONDS = registry.histogram("mcds_loop_lag_seconds", "How late the event loop ran the watchdog's tick")
+LOOP_STALLS = registry.counter("mcds_loop_stalls_total", "Times the event loop was blocked past the threshold")
+
+
+class LoopWatchdog:
+    """
+    Detects the event loop being blocked, and finds out what blocked it.
+
+    run() ticks on the loop every interval and records how late each tick was. A watcher thread checks that ticks keep
+    arriving; once one is more than threshold seconds late, the loop is stalled, and the watcher captures the loop
+    thread's current stack (via sys._current_frames) and logs it, so the callback or coroutine that's blocking is named
+    while it's still running. With profile=True, the watcher keeps sampling the stack for the rest of the stall and
+    logs the most frequent innermost frames when it ends.
+    """
+
+    def __init__(self, interval=0.25, threshold=0.5, profile=False, sample_interval=0.01):
+        self.interval = interval
+        self.threshold = threshold
+        self.profile = profile
+        self.sample_interval = sample_interval
+
+        self.loop_thread_id = None
+        self.last_tick = time.monotonic()
+        self.last_stall_end = None
+        self.last_stall_seconds = 0.0
+        self.max_lag = 0.0
+
+        self.samples = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    async def run(self):
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self.thread.start()
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(0.0, now - expected)
+                self.last_tick = now
+                self.max_lag = max(self.max_lag, lag)
+                LOOP_LAG_SECONDS.observe(lag)
+        finally:
+            self.stopped.set()
+
+    def stalled_within(self, seconds):
+        """
+        Returns whether the loop was stalled at any point in the last `seconds` seconds (including right now).
+        """
+        if time.monotonic() - self.last_tick > self.interval + self.threshold:
+            return True
+        return self.last_stall_end is not None and time.monotonic() - self.last_stall_end < seconds
+
+    def _stack(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return []
+        return traceback.extract_stack(frame)
+
+    def _watch(self):
+        while not self.stopped.wait(self.threshold / 2):
+            stall_start = self.last_tick + self.interval
+            if time.monotonic() - stall_start < self.threshold:
+                continue
+
+            LOOP_STALLS.inc()
+            stack = self._stack()
+            logging.warning(
+                f"event loop blocked for {time.monotonic() - stall_start:.2f}s, in:\n"
+                f"{''.join(traceback.format_list(stack))}"
+            )
+
+            # Wait for the stall to end, sampling the stack if profiling.
+            self.samples.clear()
+            sample_count = 0
+            tick = self.last_tick
+            while self.last_tick == tick and not self.stopped.is_set():
+                if self.profile:
+                    # Counting the innermost frame shows where the time goes; the frames above it are the same loop
+                    # and handler frames already logged with the stack.
+                    stack = self._stack()
+                    if stack:
+                        sample_count += 1
+                        self.samples[f"{stack[-1].filename}:{stack[-1].lineno} {stack[-1].name}"] += 1
+                    time.sleep(self.sample_interval)
+                else:
+                    time.sleep(self.threshold / 2)
+
+            self.last_stall_seconds = self.last_tick - stall_start
+            self.last_stall_end = self.last_tick
+            logging.warning(f"event loop unblocked after {self.last_stall_seconds:.2f}s")
+            if self.profile and sample_count:
+                profile = "\n".join(
+                    f"{count / sample_count:6.1%} {frame}" for frame, count in self.samples.most_common(15)
+                )
+                logging.warning(f"stall profile ({sample_count} samples):\n{profile}")
+
+
+if __name__ == '__main__':
+    # Stall check: a blocking call on the loop should be reported with its stack and profile.
+    logging.basicConfig(level=logging.INFO)
+
+    def blocking_handler():
+        deadline = time.monotonic() + 1.5
+        while time.monotonic() < deadline:
+            sum(range(1000))
+
+    async def main():
+        watchdog = LoopWatchdog(profile=True)
+        task = asyncio.create_task(watchdog.run())
+        await asyncio.sleep(0.5)
+        blocking_handler()
+        await asyncio.sleep(0.5)
+        assert watchdog.stalled_within(1), "stall wasn't detected"
+        print(f"max lag {watchdog.max_lag:.2f}s, last stall {watchdog.last_stall_seconds:.2f}s")
+        task.cancel()
+
+    asyncio.run(main())
@@ -1,20 +1,36 @@
+import gzip
 import json
-import re
-import time
 import asyncio
 import discord
-import csv
 import pathlib
 import random
-from io import BytesIO
+import re
 import logging
-from collections import deque
+from io import BytesIO
 
 from mc_process import MCProcess
+from event_bus import EventBus
+from console_flusher import ConsoleFlusher
+from console_archive import ConsoleArchive
+from channel_registry import ChannelRegistry
+from fanout import FanOutSender
+from outbound_queue import OutboundQueue
+from roster import Roster
+from journal import Journal
+from emotes import EmoteTable
+from datapack import ObjectivesDatapack
+from member_index import MemberIndex
+from identity import IdentityLinks
+from presence import PresenceManager
+from metrics import registry, MetricsServer
+from loop_watchdog import LoopWatchdog
+from liveness import LivenessMonitor
 from mc_event import Done, PlayerMessage, PlayerJoin, PlayerLeave, Shutdown, List, \
-    Trigger, WhitelistAdd, WhitelistRemove, GodQuestion, RawData, Event
+    Trigger, WhitelistAdd, WhitelistRemove, GodQuestion, Event
 from bedrock import God
+from god_scheduler import GodScheduler
 from util import create_task
+from log_pipeline import configure_logging
 from config import Config
 
 mc_discord_dir = pathlib.Path(__file__).parent.resolve()
@@ -25,31 +41,15 @@ class ServerMessage:
         self.username = username
         self.message = message
 
-
-class Emote:
-    def __init__(self, command, local_general, local_target, global_general, global_target):
-        self.command = command
-        self.local_general = local_general
-        self.local_target = local_target
-        self.global_general = global_general
-        self.global_target = global_target
-
-    def local_general_message(self):
-        return self.local_general
-
-    def local_target_message(self, target):
-        return self.local_target.replace("(Target)", target)
-
-    def global_general_message(self, player):
-        return self.global_general.replace("(Player)", player)
-
-    def global_target_message(self, player, target):
-        return self.global_target.replace("(Player)", player).replace("(Target)", target)
+    def describe(self):
+        return f"{self.username} says: {self.message}"
 
 
 class MCSync(discord.Client):
     PRE_INIT_SERVER_HEARTBEAT_SECONDS = 120
     SERVER_HEARTBEAT_SECONDS = 30
+    GOD_THINKING_DELAY_SECONDS = 2
+    EMOTE_RELOAD_SECONDS = 10
 
     def __init__(self, *, intents, **options):
         super().__init__(intents=intents, **options)
@@ -64,9 +64,17 @@ class MCSync(discord.Client):
         ]
 
         self.category_name = Config.category
+        self.channel_registry = ChannelRegistry(self.category_name, self.channel_names)
+        self.fanout = FanOutSender()
+        self.member_index = MemberIndex()
+        self.identity_links = IdentityLinks(f"{mc_discord_dir}/links.db")
+        self.identity_links.load()
+        self.identity_links_task = None
+        self.outbound_queue = OutboundQueue(self.send_discord_message)
         self.shutdown_command = Config.shutdown_command
 
-        self.active_players = []
+        self.roster = Roster()
+        self.presence = PresenceManager(self.change_presence, self.category_name)
         self.mc_process_task = None
         self.server_data_task = None
         self.shutdown_task = None
@@ -77,29 +85,66 @@ class MCSync(discord.Client):
         self.startup_data = []
 
         self.heartbeat_task = None
-        self.last_server_data_receive_time = None
+        self.liveness = None
+        self.liveness_warned = False
 
         self.objectives = {"roll", "compass"}
-        self.emotes = {}
-        with open(f"{mc_discord_dir}/emotes.csv") as emote_file:
-            reader = csv.reader(emote_file)
-            for row in reader:
-                command = row[0]
-                local_general = row[1]
-                local_target = row[2]
-                global_general = row[3]
-                global_target = row[4]
-                self.emotes[command] = Emote(command, local_general, local_target, global_general, global_target)
-                self.objectives.add(command)
-
-        self.mc_process = MCProcess(Config.launch_command)
-        self.mc_process.listen_for_event(self.handle_event)
+        self.emotes = EmoteTable(f"{mc_discord_dir}/emotes.csv")
+        added_emotes, _ = self.emotes.reload_if_changed()
+        self.objectives.update(added_emotes)
+        self.emote_reload_task = None
+
+        self.datapack = None
+        if Config.world_path is not None:
+            self.datapack = ObjectivesDatapack(Config.world_path, Config.datapack_pack_format)
+            if self.datapack.write_if_changed(self.objectives):
+                logging.info(f"Wrote objectives datapack to {self.datapack.path}")
+
+        self.event_bus = EventBus()
+        self.event_bus_task = None
+        for event_type, handler, lane in [
+            (Done, self.on_done, "server"),
+            (Shutdown, self.on_shutdown, "server"),
+            (PlayerMessage, self.on_player_message, "players"),
+            (PlayerJoin, self.on_player_join, "players"),
+            (PlayerLeave, self.on_player_leave, "players"),
+            (List, self.on_list, "players"),
+            (Trigger, self.on_trigger, "players"),
+            (WhitelistAdd, self.on_whitelist_add, "commands"),
+            (WhitelistRemove, self.on_whitelist_remove, "commands"),
+            (GodQuestion, self.on_god_question, "god"),
+        ]:
+            self.event_bus.subscribe(event_type, handler, lane)
+
+        self.mc_process = MCProcess(Config.launch_command, Config.command_pacing_seconds)
+        self.mc_process.listen_for_event(self.on_server_event)
+        self.liveness = LivenessMonitor(
+            self.mc_process,
+            failures_to_fail=Config.liveness_failures,
+            ping_port=Config.server_ping_port
+        )
+        self.console_archive = None
+        self.console_archive_task = None
+        if Config.console_archive_dir is not None:
+            self.console_archive = ConsoleArchive(
+                Config.console_archive_dir,
+                max_bytes=Config.console_archive_max_bytes
+            )
+            self.console_archive.load()
+            self.mc_process.archive = self.console_archive
+        self.console_flusher = ConsoleFlusher(
+            self.mc_process.console_buffer,
+            lambda message: self.send_discord_message(self.console_channel_name, message),
+            lambda data, file_name: self.send_discord_text_file(self.console_channel_name, data, file_name),
+        )
 
         self.god = None
-        self.god_context_log = deque(maxlen=40)
+        self.god_scheduler = None
+        self.god_journal = Journal(Config.god_context_chars)
         if God.available():
             logging.info(f"God ({Config.god_alias}) is available")
             self.god = God()
+            self.god_scheduler = GodScheduler(self.god, Config.god_alias)
 
         self.manhunt_mode = Config.manhunt_mode
         if self.manhunt_mode:
@@ -107,158 +152,193 @@ class MCSync(discord.Client):
 
         self.inactive_shutdown_seconds = Config.inactive_shutdown_seconds
 
+        for name, description, read in [
+            ("mcds_console_buffer_bytes", "Console output waiting to be sent to Discord",
+             lambda: self.mc_process.console_buffer.size),
+            ("mcds_event_bus_depth", "Events waiting for their handlers", self.event_bus.depth),
+            ("mcds_outbound_queue_depth", "Discord messages waiting to be sent", self.outbound_queue.depth),
+            ("mcds_command_queue_depth", "Console commands waiting to be written",
+             lambda: len(self.mc_process.command_writer.pending)),
+            ("mcds_players", "Players on the server", lambda: len(self.roster)),
+        ]:
+            registry.gauge(name, description, read)
+        self.metrics_server = None
+        self.metrics_task = None
+        self.loop_watchdog = LoopWatchdog(threshold=Config.loop_lag_threshold_seconds, profile=Config.loop_lag_profile)
+        self.loop_watchdog_task = None
+        if Config.metrics_port is not None:
+            self.metrics_server = MetricsServer(registry, Config.metrics_port)
+
     async def send_discord_message(self, channel_name, message):
-        for guild in self.guilds:
-            try:
-                category = discord.utils.get(guild.categories, name=self.category_name)
-                assert category is not None
-                channel = discord.utils.get(category.text_channels, name=channel_name)
-                assert channel is not None
-                await channel.send(message)
-            except discord.DiscordException as e:
-                logging.exception(e)
-            except OSError as e:
-                logging.exception(e)
+        await self.fanout.send(self.channel_registry.channels_named(channel_name), content=message)
+
+    def queue_discord_message(self, channel_name, message):
+        self.outbound_queue.enqueue(channel_name, message)
 
     async def send_discord_text_file(self, channel_name, message, file_name):
-        for guild in self.guilds:
-            try:
-                category = discord.utils.get(guild.categories, name=self.category_name)
-                assert category is not None
-                channel = discord.utils.get(category.text_channels, name=channel_name)
-                assert channel is not None
-                await channel.send(file=discord.File(BytesIO(message.encode("utf-8")), file_name))
-            except discord.DiscordException as e:
-                logging.exception(e)
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        await self.fanout.send(self.channel_registry.channels_named(channel_name), file=(message, file_name))
 
     async def on_ready(self):
         logging.info(f"Logged on as {self.user}")
 
         await self.create_channels()
-
-        self.mc_process_task = create_task(self.mc_process.poll())
-        self.server_data_task = create_task(self.push_server_data())
-        self.heartbeat_task = create_task(self.probe_server_heartbeat())
-
-        activity = discord.Activity(
-            name=f"{self.category_name} initialize...",
-            type=discord.ActivityType.watching
-        )
-        await self.change_presence(status=discord.Status.idle, activity=activity)
+        self.member_index.build(self.guilds)
+
+        # discord.py calls on_ready again after e.g. a failed RESUME, so each task is only started once; a second event
+        # bus consumer in particular would break the per-lane ordering.
+        if self.event_bus_task is None:
+            self.event_bus_task = create_task(self.event_bus.run())
+        if self.mc_process_task is None:
+            self.mc_process_task = create_task(self.mc_process.poll())
+            self.presence.set(phase=PresenceManager.INITIALIZING)
+        if self.server_data_task is None:
+            self.server_data_task = create_task(self.console_flusher.run())
+        if self.heartbeat_task is None:
+            self.heartbeat_task = create_task(self.probe_server_heartbeat())
+        if self.emote_reload_task is None:
+            self.emote_reload_task = create_task(self.reload_emotes())
+        if self.identity_links_task is None:
+            self.identity_links_task = create_task(self.identity_links.run())
+        if self.console_archive is not None and self.console_archive_task is None:
+            self.console_archive_task = create_task(self.console_archive.run())
+        if self.loop_watchdog_task is None:
+            self.loop_watchdog_task = create_task(self.loop_watchdog.run())
+        if self.metrics_server is not None and self.metrics_task is None:
+            self.metrics_task = create_task(self.metrics_server.run())
 
     async def create_channels(self):
+        self.channel_registry.resolve(self.guilds)
         for guild in self.guilds:
             try:
+                missing_channel_names = [
+                    channel_name for channel_name in self.channel_names
+                    if self.channel_registry.get(guild, channel_name) is None
+                ]
+                if not missing_channel_names:
+                    continue
+
                 category = discord.utils.get(guild.categories, name=self.category_name)
                 if not category:
                     logging.info(f"Creating {self.category_name} category")
-                    await guild.create_category(self.category_name)
+                    category = await guild.create_category(self.category_name)
 
-                category = discord.utils.get(guild.categories, name=self.category_name)
-                assert category is not None
-
-                for channel_name in self.channel_names:
-                    channel = discord.utils.get(category.text_channels, name=channel_name)
-                    if not channel:
-                        logging.info(f"Creating {channel_name} channel")
-                        await category.create_text_channel(channel_name)
+                for channel_name in missing_channel_names:
+                    logging.info(f"Creating {channel_name} channel")
+                    await category.create_text_channel(channel_name)
             except discord.DiscordException as e:
                 logging.exception(e)
+        self.channel_registry.resolve(self.guilds)
 
-    async def push_server_data(self):
-        while True:
-            await asyncio.sleep(1)
+    async def on_guild_channel_create(self, channel):
+        self.channel_registry.invalidate(self.guilds)
 
-            chunk = self.mc_process.get_all()
-            if chunk is None:
-                continue
+    async def on_guild_channel_delete(self, channel):
+        self.channel_registry.invalidate(self.guilds)
 
-            if len(chunk) > 1950:
-                await self.send_discord_text_file(self.console_channel_name, chunk, "server-data.txt")
-            else:
-                await self.send_discord_message(
-                    self.console_channel_name,
-                    "```" +
-                    chunk +
-                    "```"
-                )
+    async def on_guild_channel_update(self, before, after):
+        self.channel_registry.invalidate(self.guilds)
 
-    async def handle_event(self, event):
-        handler = {
-            RawData: self.on_raw_data,
-            Done: self.on_done,
-            PlayerMessage: self.on_player_message,
-            PlayerJoin: self.on_player_join,
-            PlayerLeave: self.on_player_leave,
-            List: self.on_list,
-            Shutdown: self.on_shutdown,
-            Trigger: self.on_trigger,
-            WhitelistAdd: self.on_whitelist_add,
-            WhitelistRemove: self.on_whitelist_remove,
-            GodQuestion: self.on_god_question,
-        }.get(type(event))
-        if handler is None:
-            return
+    async def on_guild_join(self, guild):
+        self.channel_registry.invalidate(self.guilds)
+        for member in guild.members:
+            self.member_index.add(member)
+
+    async def on_guild_remove(self, guild):
+        self.channel_registry.invalidate(self.guilds)
+        for member in guild.members:
+            self.member_index.remove(member)
 
-        await handler(event)
+    async def on_member_join(self, member):
+        self.member_index.add(member)
 
-    async def on_raw_data(self, raw_data):
-        self.last_server_data_receive_time = time.time()
+    async def on_member_update(self, before, after):
+        self.member_index.add(after)
+
+    async def on_member_remove(self, member):
+        self.member_index.remove(member)
+
+    async def on_user_update(self, before, after):
+        # Username and global name changes apply to the user's member in every guild.
+        for guild in self.guilds:
+            member = guild.get_member(after.id)
+            if member is not None:
+                self.member_index.add(member)
+
+    async def on_server_event(self, event):
+        # A link code said in chat stays out of the journal, so it never ends up in a prompt sent to God.
+        if not self.is_link_message(event):
+            self.god_journal.record(event)
+        await self.event_bus.publish(event)
 
     async def on_done(self, done):
         logging.info(f"done: {done.init_time}")
         self.server_done = True
         self.shutdown_task = create_task(self.inactive_shutdown_timer(self.inactive_shutdown_seconds))
-        self.init_objectives_task = create_task(self.init_objectives())
+        if self.datapack is None:
+            self.init_objectives_task = create_task(self.init_objectives())
 
-        await self.send_discord_message(
+        self.queue_discord_message(
             self.commands_channel_name,
             f"{self.category_name} is ready!"
         )
 
-        activity = discord.Activity(
-            name=f"0 players on {self.category_name}",
-            type=discord.ActivityType.watching
-        )
-        await self.change_presence(status=discord.Status.online, activity=activity)
+        self.presence.set(phase=PresenceManager.READY, player_count=len(self.roster))
 
     async def on_player_message(self, player_message):
         message = player_message.message
+        if self.is_link_message(player_message):
+            await self.complete_identity_link(player_message.username, message[len("!link "):].strip())
+            return
         logging.info(f"player message: {message}")
-        self.god_context_log.append(f"{player_message.username} says: {message}")
-
-        mentioned_users = re.findall(r"@([a-zA-Z0-9_]{2,16})", message)
-        for mentioned_user in mentioned_users:
-            for guild in self.guilds:
-                try:
-                    discord_member = guild.get_member_named(mentioned_user)
-                    if discord_member:
-                        message = message.replace(f"@{mentioned_user}", discord_member.mention)
-                        break
-                except discord.DiscordException as e:
-                    logging.exception(e)
 
-        await self.send_discord_message(
+        message = self.member_index.replace_mentions(message, self.member_for_mention)
+
+        self.queue_discord_message(
             self.chat_channel_name,
             f"***@{player_message.username}***: {message}"
         )
 
+    @staticmethod
+    def is_link_message(event):
+        return isinstance(event, PlayerMessage) and event.message.startswith("!link ")
+
+    def member_for_mention(self, name):
+        discord_id = self.identity_links.discord_for(name)
+        if discord_id is not None:
+            member = self.member_index.get_by_id(discord_id)
+            if member is not None:
+                return member
+        return self.member_index.get(name)
+
+    async def complete_identity_link(self, username, code):
+        discord_id = self.identity_links.complete_link(username, code)
+        if discord_id is None:
+            message = "That link code is invalid or has expired."
+        else:
+            message = "Your Discord account is now linked."
+            self.queue_discord_message(self.commands_channel_name, f"Linked <@{discord_id}> to {username}.")
+        await self.mc_process.write(f"tellraw {username} {json.dumps([{'text': message}])}")
+
     async def on_player_join(self, player_join):
         logging.info(f"player joined: {player_join.username}")
-        self.god_context_log.append(f"{player_join.username} joined the server")
-        await self.mc_process.write("list")
-        for objective in self.objectives:
-            await self.mc_process.write(f"scoreboard players enable {player_join.username} {objective}")
-        await self.send_discord_message(
+        if self.roster.add(player_join.username):
+            self.on_roster_change()
+        if self.datapack is None:
+            await self.mc_process.write_many(
+                f"scoreboard players enable {player_join.username} {objective}" for objective in self.objectives
+            )
+        self.queue_discord_message(
             self.chat_channel_name,
             f"_***@{player_join.username}*** has joined the game._"
         )
 
     async def on_player_leave(self, player_leave):
         logging.info(f"player left: {player_leave.username}")
-        self.god_context_log.append(f"{player_leave.username} left the server")
-        await self.mc_process.write("list")
-        await self.send_discord_message(
+        if self.roster.remove(player_leave.username):
+            self.on_roster_change()
+        self.queue_discord_message(
             self.chat_channel_name,
             f"_***@{player_leave.username}*** has left the game._"
         )
@@ -266,18 +346,17 @@ class MCSync(discord.Client):
     async def on_list(self, list_):
         logging.info(f"list: {list_.players}")
 
-        if self.active_players != list_.players:
-            player_count = len(list_.players)
-            activity = discord.Activity(
-                name=f"{player_count} {'player' if player_count == 1 else 'players'} on {self.category_name}",
-                type=discord.ActivityType.watching
-            )
-            await self.change_presence(status=discord.Status.online, activity=activity)
+        missing, unexpected = self.roster.reconcile(list_.players)
+        if missing or unexpected:
+            logging.warning(f"roster drift: missing {missing}, unexpected {unexpected}")
+            self.on_roster_change()
+
+    def on_roster_change(self):
+        self.presence.set(player_count=len(self.roster))
 
-        self.active_players = list_.players
-        if len(self.active_players) == 0 and self.shutdown_task is None:
+        if len(self.roster) == 0 and self.shutdown_task is None:
             self.shutdown_task = create_task(self.inactive_shutdown_timer(self.inactive_shutdown_seconds))
-        elif len(self.active_players) > 0 and self.shutdown_task is not None:
+        elif len(self.roster) > 0 and self.shutdown_task is not None:
             self.shutdown_task.cancel()
             self.shutdown_task = None
 
@@ -296,9 +375,9 @@ class MCSync(discord.Client):
             message = emote.global_general_message(trigger.username)
             if trigger.value is not None:
                 player_index = trigger.value - 1
-                if 0 <= player_index < len(self.active_players):
-                    message = emote.global_target_message(trigger.username, self.active_players[player_index])
-                    self.god_context_log.append(message)
+                target = self.roster.player_at(player_index)
+                if target is not None:
+                    message = emote.global_target_message(trigger.username, target)
         elif trigger.objective == "roll":
             roll = random.randint(1, 100)
             message = f"{trigger.username} rolls {roll} (1-100)"
@@ -314,7 +393,8 @@ class MCSync(discord.Client):
         selector = "@a" if public else trigger.username
         await self.mc_process.write(f"tellraw {selector} {json.dumps([{'text': message}])}")
         if public:
-            await self.send_discord_message(self.chat_channel_name, message)
+            self.god_journal.record_text(message, "Trigger", trigger.username)
+            self.queue_discord_message(self.chat_channel_name, message)
 
     async def on_whitelist_add(self, whitelist_add):
         if whitelist_add.username:
@@ -322,7 +402,7 @@ class MCSync(discord.Client):
         else:
             message = "Player is already whitelisted."
         logging.info(message)
-        await self.send_discord_message(self.commands_channel_name, message)
+        self.queue_discord_message(self.commands_channel_name, message)
 
     async def on_whitelist_remove(self, whitelist_remove):
         if whitelist_remove.username:
@@ -330,23 +410,58 @@ class MCSync(discord.Client):
         else:
             message = "Player is not whitelisted."
         logging.info(message)
-        await self.send_discord_message(self.commands_channel_name, message)
-
-    async def ask_god(self, god_question):
+        self.queue_discord_message(self.commands_channel_name, message)
+
+    @staticmethod
+    def whitelist_response_for(whitelist_event, player):
+        # "already whitelisted"/"not whitelisted" don't name the player, so they answer the oldest query still waiting.
+        return whitelist_event.username is None or whitelist_event.username.lower() == player.lower()
+
+    async def ask_god(self, god_question, discord_message=None):
+        """
+        Asks God, broadcasting the reply. `discord_message` is the message the question was asked in, if it was asked
+        from Discord rather than in game.
+        """
         if not self.god:
             logging.info("God not found")
             return
 
-        reply = await asyncio.to_thread(
-            self.god.ask,
-            god_question.username,
-            god_question.question,
-            self.god_context_log
-        )
+        thinking_task = create_task(self.show_god_thinking())
+
+        async def on_partial(output):
+            thinking_task.cancel()
+
+        try:
+            reply = await self.god_scheduler.ask(
+                god_question.username,
+                god_question.question,
+                self.god_journal.context(),
+                on_partial=on_partial
+            )
+        except asyncio.TimeoutError:
+            logging.info(f"{Config.god_alias} timed out")
+            return
+        finally:
+            thinking_task.cancel()
+        logging.info(f"god scheduler: {self.god_scheduler.stats()}")
+
+        if reply is None:
+            # coalesced with a recent identical question, whose reply is broadcast to everyone
+            return
+        if reply is GodScheduler.RATE_LIMITED:
+            busy_message = f"{Config.god_alias} is busy, try again shortly."
+            if discord_message is not None:
+                await discord_message.channel.send(f"{discord_message.author.mention} {busy_message}")
+            else:
+                await self.mc_process.write(
+                    f"tellraw {god_question.username} "
+                    f"{json.dumps([{'text': busy_message, 'italic': True, 'color': 'gray'}])}"
+                )
+            return
 
         reply = reply.replace("\"", "")
         reply = reply.strip()
-        self.god_context_log.append(f"{Config.god_alias} says: {reply}")
+        self.god_journal.record_text(f"{Config.god_alias} says: {reply}", "God", Config.god_alias)
 
         formatted_message = json.dumps([
             "",
@@ -362,20 +477,32 @@ class MCSync(discord.Client):
         ])
         await self.mc_process.write("tellraw @a " + formatted_message)
 
-        await self.send_discord_message(
+        self.queue_discord_message(
             self.chat_channel_name,
             f"***@{Config.god_alias}***: {reply}"
         )
 
+    async def show_god_thinking(self):
+        await asyncio.sleep(self.GOD_THINKING_DELAY_SECONDS)
+        formatted_message = json.dumps([
+            {
+                "text": f"{Config.god_alias} is thinking...",
+                "italic": True,
+                "color": "gray",
+            }
+        ])
+        await self.mc_process.write("tellraw @a " + formatted_message)
+
     async def on_god_question(self, god_question):
         logging.info(f"god message: {god_question.question}")
-        await self.ask_god(god_question)
+        # God.ask bounds how many questions are in flight, so questions don't need to wait on each other here.
+        create_task(self.ask_god(god_question))
 
     async def probe_server_heartbeat(self):
-        self.last_server_data_receive_time = time.time()
+        heartbeat = self.mc_process.heartbeat
+        heartbeat.touch()
         while True:
             if self.server_done:
-                await self.mc_process.write("list")
                 heartbeat_seconds = self.SERVER_HEARTBEAT_SECONDS
             else:
                 heartbeat_seconds = self.PRE_INIT_SERVER_HEARTBEAT_SECONDS
@@ -384,18 +511,76 @@ class MCSync(discord.Client):
             if self.server_shutdown:
                 return
 
-            if time.time() - self.last_server_data_receive_time > heartbeat_seconds * 1.5:
+            lines_per_second, bytes_per_second = heartbeat.rates()
+            logging.info(f"server output: {lines_per_second:.1f} lines/s, {bytes_per_second:.0f} B/s")
+
+            # The server can't answer commands until it's done starting, so until then only output and the process
+            # count. The list query also keeps the roster reconciled, via on_list.
+            state = await self.liveness.check(
+                heartbeat_seconds * 1.5,
+                query=self.server_done,
+                stalled=self.loop_watchdog.stalled_within(heartbeat_seconds)
+            )
+            if state == LivenessMonitor.UNKNOWN:
+                logging.warning("the event loop stalled recently, skipping this liveness check")
+                continue
+            if state == LivenessMonitor.DEAD:
+                reason = "the server process exiting" if self.liveness.last_check.exited else \
+                    "losing connection with the server"
                 await self.send_discord_message(
                     self.commands_channel_name,
-                    f"Shutting down {self.category_name} due to losing connection with the server. Use `!start` to "
-                    f"reboot the instance after shutdown."
+                    f"Shutting down {self.category_name} due to {reason}. Use `!start` to reboot the instance after "
+                    f"shutdown."
                 )
                 await self.shutdown()
                 return
 
+            if state == LivenessMonitor.WARNING:
+                if self.liveness.failures == self.liveness.failures_to_fail - 1:
+                    self.liveness_warned = True
+                    self.queue_discord_message(
+                        self.commands_channel_name,
+                        f"{self.category_name} isn't responding. It will be shut down if it doesn't respond within "
+                        f"{heartbeat_seconds} seconds."
+                    )
+                continue
+
+            if self.liveness_warned:
+                self.liveness_warned = False
+                self.queue_discord_message(self.commands_channel_name, f"{self.category_name} is responding again.")
+
+            if self.server_done and await self.liveness.sample_ticks():
+                self.presence.set(tps=self.liveness.tps)
+
     async def init_objectives(self):
-        for objective in self.objectives:
-            await self.mc_process.write(f"scoreboard objectives add {objective} trigger")
+        await self.mc_process.write_many(
+            f"scoreboard objectives add {objective} trigger" for objective in self.objectives
+        )
+
+    async def reload_emotes(self):
+        while True:
+            await asyncio.sleep(self.EMOTE_RELOAD_SECONDS)
+            try:
+                added, removed = self.emotes.reload_if_changed()
+            except (OSError, ValueError) as e:
+                logging.exception(e)
+                continue
+            if not added and not removed:
+                continue
+
+            logging.info(f"reloaded emotes: added {sorted(added)}, removed {sorted(removed)}")
+            self.objectives.difference_update(removed)
+            self.objectives.update(added)
+            if self.datapack is not None:
+                if self.datapack.write_if_changed(self.objectives) and self.server_done:
+                    await self.mc_process.write("reload")
+            elif self.server_done and added:
+                await self.mc_process.write_many(
+                    f"scoreboard objectives add {objective} trigger" for objective in added
+                )
+                await self.mc_process.write_many(
+                    f"scoreboard players enable {player} {objective}" for player in self.roster for objective in added
+                )
 
     async def inactive_shutdown_timer(self, seconds):
         logging.info(f"starting shutdown timer: {seconds}")
@@ -415,6 +600,7 @@ class MCSync(discord.Client):
         await self.start_shutdown()
 
     async def start_shutdown(self):
+        self.presence.set(phase=PresenceManager.SHUTTING_DOWN)
         await self.mc_process.write("stop")
 
     async def shutdown(self):
@@ -423,10 +609,19 @@ class MCSync(discord.Client):
         if self.server_shutdown:
             return
         self.server_shutdown = True
+        self.presence.set(phase=PresenceManager.SHUTTING_DOWN)
 
         logging.info("Waiting for world to save...")
         await asyncio.sleep(30)
 
+        # The shutdown script usually powers off the machine, so anything still buffered has to be written first.
+        await self.outbound_queue.flush()
+        await self.identity_links.flush()
+        if self.console_archive is not None:
+            await self.console_archive.close()
+        if self.god is not None:
+            await self.god.close()
+
         logging.info("Executing shutdown script")
         shutdown_process = await asyncio.create_subprocess_exec(
             self.shutdown_command,
@@ -441,6 +636,53 @@ class MCSync(discord.Client):
             logging.info(stderr)
         await self.close()
 
+    async def send_logs(self, channel, args):
+        invalid_usage_message = f"Usage:\n" \
+                                f"`!logs <since> [pattern]`\n" \
+                                f"> `since` is e.g. `30m`, `2h`, `1d` or `2024-06-01T18:00`. `pattern` is a regular " \
+                                f"expression, optionally preceded by `event:<type>` (e.g. `event:PlayerLeave`)."
+        if self.console_archive is None:
+            await channel.send("The console archive is disabled.")
+            return
+        if not args:
+            await channel.send(invalid_usage_message)
+            return
+
+        since = ConsoleArchive.parse_since(args[0])
+        event = None
+        pattern_args = args[1:]
+        if pattern_args and pattern_args[0].startswith("event:"):
+            event = pattern_args[0][len("event:"):]
+            pattern_args = pattern_args[1:]
+        pattern = " ".join(pattern_args) or None
+        if since is None:
+            await channel.send(invalid_usage_message)
+            return
+
+        try:
+            result = await self.console_archive.search(since, pattern, event)
+        except re.error as e:
+            await channel.send(f"Invalid pattern: {e}")
+            return
+        if not result:
+            await channel.send("No matching lines.")
+            return
+
+        line_count = result.count("\n")
+        data = result.encode("utf-8")
+        file_name = "logs.txt"
+        if len(data) > 1024 * 1024:
+            data = gzip.compress(data)
+            file_name += ".gz"
+        try:
+            await channel.send(
+                f"{line_count} matching lines.",
+                file=discord.File(BytesIO(data), file_name)
+            )
+        except discord.DiscordException as e:
+            logging.exception(e)
+            await channel.send(f"Couldn't send the logs: {e}")
+
     async def send_server_chat_message(self, message):
         formatted_message = json.dumps([
             "",
@@ -476,17 +718,24 @@ class MCSync(discord.Client):
             return
 
         if message.channel.name == self.console_channel_name:
+            # The archive holds everything the console channel shows (player IPs, commands typed by admins), so it's
+            # searched from here rather than from the commands channel. Server commands never start with "!".
+            console_args = message.content.split()
+            if console_args and console_args[0] == "!logs":
+                await self.send_logs(message.channel, console_args[1:])
+                return
             await self.mc_process.write(message.content)
             return
 
         if message.channel.name == self.chat_channel_name:
-            server_message = ServerMessage(message.author, message.content)
+            username = self.identity_links.player_for(message.author.id) or message.author
+            server_message = ServerMessage(username, message.content)
             await self.send_server_chat_message(server_message)
 
             if GodQuestion.is_godly(message.content):
-                await self.ask_god(GodQuestion(message.author, message.content))
+                await self.ask_god(GodQuestion(username, message.content), discord_message=message)
 
-            self.god_context_log.append(f"{message.author} says: {message.content}")
+            self.god_journal.record(server_message)
             return
 
         if message.channel.name == self.commands_channel_name:
@@ -511,38 +760,88 @@ class MCSync(discord.Client):
                     f"Forcefully stopping {self.category_name}.\n"
                 )
                 await self.shutdown()
+            if command == "stats":
+                await message.channel.send(f"```\n{registry.summary()[:1990]}\n```")
+            if command == "link":
+                if len(args) != 1:
+                    await message.channel.send(f"Usage:\n`!link <player>`")
+                    return
+                player = args[0]
+                code = self.identity_links.start_link(message.author.id, player)
+                await message.channel.send(
+                    f"To link {message.author.mention} to {player}, say `!link {code}` in Minecraft chat as {player} "
+                    f"within {IdentityLinks.CODE_TTL_SECONDS // 60} minutes."
+                )
+            if command == "unlink":
+                player = self.identity_links.unlink(message.author.id)
+                if player is None:
+                    await message.channel.send(f"{message.author.mention} is not linked to a player.")
+                else:
+                    await message.channel.send(f"Unlinked {message.author.mention} from {player}.")
             if command == "whitelist":
                 invalid_usage_message = f"Usage:\n" \
-                                        f"`!whitelist <add/remove> <player>`"
-                if len(args) != 2:
+                                        f"`!whitelist <add/remove> [player or @member]`\n" \
+                                        f"> Without a player, your linked player (see `!link`) is used."
+                if len(args) not in (1, 2):
                     await message.channel.send(invalid_usage_message)
                     return
 
                 add_remove = args[0]
-                player = args[1]
+                if len(args) == 1:
+                    player = self.identity_links.player_for(message.author.id)
+                elif message.mentions:
+                    player = self.identity_links.player_for(message.mentions[0].id)
+                else:
+                    player = args[1]
+                if player is None:
+                    await message.channel.send(invalid_usage_message)
+                    return
                 if add_remove == "add":
                     await message.channel.send(
                         f"Whitelisting {player}..."
                     )
-                    await self.mc_process.write(f"whitelist add {player}")
+                    # The response is reported by on_whitelist_add, like whitelist changes made from the console.
+                    try:
+                        await self.mc_process.query(
+                            f"whitelist add {player}",
+                            expect=WhitelistAdd,
+                            match=lambda event: self.whitelist_response_for(event, player)
+                        )
+                    except asyncio.TimeoutError:
+                        await message.channel.send(f"{self.category_name} did not respond.")
                 elif add_remove == "remove":
                     await message.channel.send(
                         f"Removing {player} from whitelist..."
                     )
-                    await self.mc_process.write(f"whitelist remove {player}")
+                    try:
+                        await self.mc_process.query(
+                            f"whitelist remove {player}",
+                            expect=WhitelistRemove,
+                            match=lambda event: self.whitelist_response_for(event, player)
+                        )
+                    except asyncio.TimeoutError:
+                        await message.channel.send(f"{self.category_name} did not respond.")
                 else:
                     await message.channel.send(invalid_usage_message)
                     return
 
 
-logging.basicConfig(
-    format="[%(asctime)s.%(msecs)03d] [%(filename)s:%(lineno)d] [%(levelname)s] %(message)s",
-    filename="logs/log.txt",
-    level=logging.INFO
-)
-logging.getLogger().addHandler(logging.StreamHandler())
-logging.info("\n\n==================================================\n\n")
-
-intents = discord.Intents.all()
-client = MCSync(intents=intents)
-client.run(Config.discord_token)
+if __name__ == '__main__':
+    log_listener = configure_logging(
+        "logs/log.txt",
+        max_bytes=Config.log_max_bytes,
+        interval=Config.log_rotate_seconds,
+        backup_count=Config.log_backup_count,
+        compress=Config.log_compress,
+        # logged on every heartbeat or every few seconds
+        repeat_prefixes=["list:", "server output:"],
+    )
+    logging.info("\n\n==================================================\n\n")
+
+    intents = discord.Intents.all()
+    client = MCSync(intents=intents)
+    try:
+        # client.run() sets up its own log handler unless told not to.
+        client.run(Config.discord_token, log_handler=None)
+    finally:
+        log_listener.stop()
@@ -3,39 +3,129 @@ import re
 
 from config import Config
 
+
 class Event(ABC):
+    # Substrings that must appear in a line for parse() to be worth calling. An event without keywords is a candidate
+    # for every line.
+    keywords = ()
+
     @staticmethod
     @abstractmethod
     def parse(line: str):
         pass
 
+    @abstractmethod
+    def describe(self):
+        """
+        Describes the event for God's context, or returns None if it isn't worth telling God about.
+        """
+        pass
 
-class RawData(Event):
-    def __init__(self, data):
-        self.data = data
 
-    @staticmethod
-    def parse(line: str):
-        return RawData(line)
+class LineParser:
+    """
+    Classifies server log lines into events in a single pass.
 
+    Every registered event's keywords are folded into one compiled pattern, so a line that can't produce an event costs
+    a single regex scan. Only the events whose keywords appear in the line run their own (precompiled) parse. Events
+    registered with `derived_from` are built from another event's result rather than from the line, so e.g. a
+    GodQuestion doesn't re-parse the chat message.
+    """
 
+    def __init__(self):
+        self.events = []
+        self.derived = {}
+
+        self._keyword_events = {}
+        self._unfiltered_events = []
+        self._keyword_pattern = None
+
+    def register(self, event=None, *, derived_from=None):
+        def decorator(event_):
+            if derived_from is not None:
+                self.derived.setdefault(derived_from, []).append(event_)
+            else:
+                self.events.append(event_)
+            self._compile()
+            return event_
+
+        if event is not None:
+            return decorator(event)
+        return decorator
+
+    def _compile(self):
+        self._keyword_events = {}
+        self._unfiltered_events = []
+        for event in self.events:
+            if not event.keywords:
+                self._unfiltered_events.append(event)
+            for keyword in event.keywords:
+                self._keyword_events.setdefault(keyword, []).append(event)
+
+        self._keyword_pattern = None
+        if self._keyword_events:
+            # Longest first, so that a keyword which contains another one wins the alternation.
+            keywords = sorted(self._keyword_events, key=len, reverse=True)
+            self._keyword_pattern = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+
+    def candidates(self, line: str):
+        candidates = list(self._unfiltered_events)
+        if self._keyword_pattern is not None:
+            for keyword in self._keyword_pattern.findall(line):
+                for event in self._keyword_events[keyword]:
+                    if event not in candidates:
+                        candidates.append(event)
+        if len(candidates) > 1:
+            candidates.sort(key=self.events.index)
+        return candidates
+
+    def parse(self, line: str):
+        parsed = []
+        for event in self.candidates(line):
+            result = event.parse(line)
+            if not result:
+                continue
+            parsed.append(result)
+            for derived_event in self.derived.get(event, []):
+                derived = derived_event.derive(result)
+                if derived:
+                    parsed.append(derived)
+        return parsed
+
+
+parser = LineParser()
+
+
+@parser.register
 class Done(Event):
+    keywords = (": Done (",)
+    PATTERN = re.compile(r'^[^<>]*: Done \(([0-9.sm]+)\)! For help, type "help"')
+
     def __init__(self, init_time):
         self.init_time = init_time
 
+    def describe(self):
+        return f"The server started (took {self.init_time})"
+
     @staticmethod
     def parse(line: str):
         # [15:20:41] [Server thread/INFO]: Done (3.854s)! For help, type "help"
-        match = re.match(r'^[^<>]*: Done \(([0-9.sm]+)\)! For help, type "help"', line)
+        match = Done.PATTERN.match(line)
         if match:
             return Done(match.group(1))
 
 
+@parser.register
 class PlayerMessage(Event):
+    keywords = (": <",)
+
     def __init__(self, username, message):
         self.username = username
         self.message = message
 
+    def describe(self):
+        return f"{self.username} says: {self.message}"
+
     @staticmethod
     def parse(line):
         if "[Server thread/INFO]" not in line:
@@ -54,49 +144,79 @@ class PlayerMessage(Event):
         return PlayerMessage(username, message)
 
 
+@parser.register
 class PlayerJoin(Event):
+    keywords = (" joined the game",)
+    PATTERN = re.compile(r"^[^<>*]*: ([a-zA-Z0-9_]{2,16}) joined the game")
+
     def __init__(self, username):
         self.username = username
 
+    def describe(self):
+        return f"{self.username} joined the server"
+
     @staticmethod
     def parse(line: str):
-        match = re.match(r"^[^<>*]*: ([a-zA-Z0-9_]{2,16}) joined the game", line)
+        match = PlayerJoin.PATTERN.match(line)
         if match:
             return PlayerJoin(match.group(1))
         return None
 
 
+@parser.register
 class PlayerLeave(Event):
+    keywords = (" left the game",)
+    PATTERN = re.compile(r"^[^<>*]*: ([a-zA-Z0-9_]{2,16}) left the game")
+
     def __init__(self, username):
         self.username = username
 
+    def describe(self):
+        return f"{self.username} left the server"
+
     @staticmethod
     def parse(line: str):
-        match = re.match(r"^[^<>*]*: ([a-zA-Z0-9_]{2,16}) left the game", line)
+        match = PlayerLeave.PATTERN.match(line)
         if match:
             return PlayerLeave(match.group(1))
         return None
 
 
+@parser.register
 class Shutdown(Event):
+    keywords = (": All dimensions are saved", ": Stopping server")
+    PATTERN = re.compile(r"^[^<>*]*: All dimensions are saved|^[^<>*]*: Stopping server")
+
     def __init__(self):
         pass
 
+    def describe(self):
+        return "The server is shutting down"
+
     @staticmethod
     def parse(line: str):
-        match = re.match(r"^[^<>*]*: All dimensions are saved|^[^<>*]*: Stopping server", line)
+        match = Shutdown.PATTERN.match(line)
         if match:
             return Shutdown()
         return None
 
 
+@parser.register
 class List(Event):
+    keywords = (" players online:",)
+    PATTERN = re.compile(r"^[^<>]*: There are [0-9]+ of a max of [0-9]+ players online:(.*)")
+    V12_PATTERN = re.compile(r"^[^<>]*:(.*)")
+
     def __init__(self, players):
         self.players = players
 
+    def describe(self):
+        # Polled periodically; joins and leaves already describe changes to the player list.
+        return None
+
     @staticmethod
     def parse(line: str):
-        match = re.match(r"^[^<>]*: There are [0-9]+ of a max of [0-9]+ players online:(.*)", line)
+        match = List.PATTERN.match(line)
         if match:
             players_list = match.group(1)
             if not players_list:
@@ -107,7 +227,7 @@ class List(Event):
     @staticmethod
     def from_v12(line: str):
         # [01:31:07] [Server thread/INFO] [minecraft/DedicatedServer]: goatgoose1142
-        match = re.match(r"^[^<>]*:(.*)", line)
+        match = List.V12_PATTERN.match(line)
         assert match is not None
         players_list = match.group(1)
         if not players_list:
@@ -121,16 +241,33 @@ class List(Event):
         return [player.strip() for player in players]
 
 
+@parser.register
 class V12ListIndicator(Event):
+    keywords = (" players online:",)
+    PATTERN = re.compile(r"^[^<>]*: There are [0-9]+/[0-9]+ players online:")
+
+    def describe(self):
+        return None
+
     @staticmethod
     def parse(line: str):
         # [01:31:07] [Server thread/INFO] [minecraft/DedicatedServer]: There are 1/20 players online:
-        match = re.match(r"^[^<>]*: There are [0-9]+/[0-9]+ players online:", line)
+        match = V12ListIndicator.PATTERN.match(line)
         if match:
             return V12ListIndicator()
 
 
+@parser.register
 class Trigger(Event):
+    keywords = (": Triggered [",)
+    PATTERN = re.compile(
+        r"^[^<>]*: \["
+        r"([a-zA-Z0-9_]{2,16}): "
+        r"Triggered \[([a-zA-Z0-9_]+)\] ?"
+        r"\(?(?:added ([0-9]+) to value|set value to ([0-9]+))?\)?"
+        r"\]"
+    )
+
     def __init__(self, username, objective, add_, set_):
         self.username = username
         self.objective = objective
@@ -138,19 +275,16 @@ class Trigger(Event):
         self.set = int(set_) if set_ else None
         self.value = self.add if self.add else self.set
 
+    def describe(self):
+        # The emote or roll message that results from a trigger is more useful, so MCSync.on_trigger records that.
+        return None
+
     @staticmethod
     def parse(line: str):
         # [15:58:36] [Server thread/INFO]: [goatgoose1142: Triggered [test]]
         # [14:33:17] [Server thread/INFO]: [goatgoose1142: Triggered [test] (added 11 to value)]
         # [14:32:56] [Server thread/INFO]: [goatgoose1142: Triggered [test] (set value to 1)]
-        match = re.match(
-            r"^[^<>]*: \["
-            r"([a-zA-Z0-9_]{2,16}): "
-            r"Triggered \[([a-zA-Z0-9_]+)\] ?"
-            r"\(?(?:added ([0-9]+) to value|set value to ([0-9]+))?\)?"
-            r"\]",
-            line
-        )
+        match = Trigger.PATTERN.match(line)
         if match:
             username = match.group(1)
             objective = match.group(2)
@@ -159,58 +293,108 @@ class Trigger(Event):
             return Trigger(username, objective, add_, set_)
 
 
+@parser.register
 class WhitelistAdd(Event):
+    keywords = (" to the whitelist", ": Player is already whitelisted")
+    ADDED_PATTERN = re.compile(r"^[^<>]*: Added ([a-zA-Z0-9_]{2,16}) to the whitelist")
+    ALREADY_WHITELISTED_PATTERN = re.compile(r"^[^<>]*: Player is already whitelisted")
+
     def __init__(self, username):
         self.username = username
 
+    def describe(self):
+        if self.username is None:
+            return None
+        return f"{self.username} was added to the whitelist"
+
     @staticmethod
     def parse(line: str):
-        player_added_match = re.match(
-            r"^[^<>]*: Added ([a-zA-Z0-9_]{2,16}) to the whitelist",
-            line
-        )
+        player_added_match = WhitelistAdd.ADDED_PATTERN.match(line)
         if player_added_match:
             username = player_added_match.group(1)
             return WhitelistAdd(username)
 
-        already_whitelisted_match = re.match(
-            r"^[^<>]*: Player is already whitelisted",
-            line
-        )
+        already_whitelisted_match = WhitelistAdd.ALREADY_WHITELISTED_PATTERN.match(line)
         if already_whitelisted_match:
             return WhitelistAdd(None)
 
 
+@parser.register
 class WhitelistRemove(Event):
+    keywords = (" from the whitelist", ": Player is not whitelisted")
+    REMOVED_PATTERN = re.compile(r"^[^<>]*: Removed ([a-zA-Z0-9_]{2,16}) from the whitelist")
+    NOT_WHITELISTED_PATTERN = re.compile(
+        r"^[^<>]*: Player is not whitelisted|^[^<>]*: Could not remove [a-zA-Z0-9_]{2,16} from the whitelist"
+    )
+
     def __init__(self, username):
         self.username = username
 
+    def describe(self):
+        if self.username is None:
+            return None
+        return f"{self.username} was removed from the whitelist"
+
     @staticmethod
     def parse(line: str):
-        player_removed_match = re.match(
-            r"^[^<>]*: Removed ([a-zA-Z0-9_]{2,16}) from the whitelist",
-            line
-        )
+        player_removed_match = WhitelistRemove.REMOVED_PATTERN.match(line)
         if player_removed_match:
             username = player_removed_match.group(1)
             return WhitelistRemove(username)
 
-        player_not_whitelisted_match = re.match(
-            r"^[^<>]*: Player is not whitelisted|^[^<>]*: Could not remove [a-zA-Z0-9_]{2,16} from the whitelist",
-            line
-        )
+        player_not_whitelisted_match = WhitelistRemove.NOT_WHITELISTED_PATTERN.match(line)
         if player_not_whitelisted_match:
             return WhitelistRemove(None)
 
 
+@parser.register
+class TickQuery(Event):
+    keywords = ("Average time per tick: ",)
+    # The line may or may not carry the log prefix, since it's the second line of the command's multi-line output.
+    PATTERN = re.compile(r"^[^<>]*Average time per tick: ([0-9.]+)ms \(Target: ([0-9.]+)ms\)")
+
+    def __init__(self, mspt, target_mspt):
+        self.mspt = mspt
+        self.target_mspt = target_mspt
+        # The server runs at its target rate unless ticks take longer than the target.
+        self.tps = 1000 / max(mspt, target_mspt) if max(mspt, target_mspt) > 0 else 0.0
+
+    def describe(self):
+        return None
+
+    @staticmethod
+    def parse(line: str):
+        # [16:02:11] [Server thread/INFO]: The game is running normally
+        # Target tick rate: 20.0 per second.
+        # Average time per tick: 3.2ms (Target: 50.0ms)
+        match = TickQuery.PATTERN.match(line)
+        if match:
+            return TickQuery(float(match.group(1)), float(match.group(2)))
+
+
+@parser.register(derived_from=PlayerMessage)
 class GodQuestion(Event):
+    # The alias as a whole word, so e.g. "Godzilla" doesn't summon God.
+    ALIAS_PATTERN = re.compile(rf"(?<!\w){re.escape(Config.god_alias)}(?!\w)", re.IGNORECASE)
+
     def __init__(self, username, question):
         self.username = username
         self.question = question
 
+    def describe(self):
+        # The PlayerMessage this was derived from already describes the question.
+        return None
+
     @staticmethod
     def is_godly(line: str):
-        return Config.god_alias.lower() in line.lower()
+        return GodQuestion.ALIAS_PATTERN.search(line) is not None
+
+    @staticmethod
+    def derive(player_message: PlayerMessage):
+        if not GodQuestion.is_godly(player_message.message):
+            return None
+
+        return GodQuestion(player_message.username, player_message.message)
 
     @staticmethod
     def parse(line: str):
@@ -218,7 +402,119 @@ class GodQuestion(Event):
         if player_message is None:
             return None
 
-        if not GodQuestion.is_godly(player_message.message):
+        return GodQuestion.derive(player_message)
+
+
+if __name__ == '__main__':
+    # Microbenchmark: python3 mc_event.py [path/to/recorded.log]
+    import sys
+    import time
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], errors="replace") as log_file:
+            corpus = [line.strip() for line in log_file]
+    else:
+        corpus = [
+            "[15:20:38] [Worker-Main-2/INFO]: Preparing spawn area: 83%",
+            "[15:20:38] [Server thread/INFO]: [STDOUT]: Loaded 412 recipes for mod examplemod",
+            "[15:20:39] [Server thread/WARN]: Ambiguity between arguments [teleport, location] and [teleport, targets]",
+            "[15:20:41] [Server thread/INFO]: Done (3.854s)! For help, type \"help\"",
+            "[15:21:02] [Server thread/INFO]: goatgoose1142 joined the game",
+            "[15:21:10] [Server thread/INFO]: <goatgoose1142> hello God, how are you?",
+            "[15:21:11] [Server thread/INFO]: There are 1 of a max of 20 players online: goatgoose1142",
+            "[15:58:36] [Server thread/INFO]: [goatgoose1142: Triggered [wave]]",
+            "[15:59:00] [Server thread/INFO]: goatgoose1142 left the game",
+        ] * 10000
+
+    # The parsing this replaced, as it was: every event's parse() called on every line, each with its own re.match
+    # (so a pattern cache lookup per call), and RawData wrapping every line.
+    class RawData:
+        def __init__(self, data):
+            self.data = data
+
+    def legacy_player_message(line):
+        if "[Server thread/INFO]" not in line:
             return None
+        if (username_start := line.find(": <")) == -1:
+            return None
+        if (username_end := line.find(">", username_start + 1)) == -1:
+            return None
+        if not (username := line[username_start + 3:username_end]):
+            return None
+        if not (message := line[username_end + 1:].strip()):
+            return None
+        return PlayerMessage(username, message)
 
+    def legacy_match(pattern, event_type, *groups):
+        def parse(line):
+            match = re.match(pattern, line)
+            if match:
+                return event_type(*(match.group(group) for group in groups))
+        return parse
+
+    def legacy_whitelist(added_pattern, none_pattern, event_type):
+        def parse(line):
+            match = re.match(added_pattern, line)
+            if match:
+                return event_type(match.group(1))
+            if re.match(none_pattern, line):
+                return event_type(None)
+        return parse
+
+    def legacy_god_question(line):
+        player_message = legacy_player_message(line)
+        if player_message is None or not GodQuestion.is_godly(player_message.message):
+            return None
         return GodQuestion(player_message.username, player_message.message)
+
+    def legacy_list(line):
+        match = re.match(r"^[^<>]*: There are [0-9]+ of a max of [0-9]+ players online:(.*)", line)
+        if match:
+            return List(List._parse_players_list(match.group(1)) if match.group(1) else [])
+
+    legacy_parsers = [
+        RawData,
+        legacy_match(r'^[^<>]*: Done \(([0-9.sm]+)\)! For help, type "help"', Done, 1),
+        legacy_player_message,
+        legacy_match(r"^[^<>*]*: ([a-zA-Z0-9_]{2,16}) joined the game", PlayerJoin, 1),
+        legacy_match(r"^[^<>*]*: ([a-zA-Z0-9_]{2,16}) left the game", PlayerLeave, 1),
+        legacy_match(r"^[^<>*]*: All dimensions are saved|^[^<>*]*: Stopping server", Shutdown),
+        legacy_list,
+        legacy_match(r"^[^<>]*: There are [0-9]+/[0-9]+ players online:", V12ListIndicator),
+        legacy_match(
+            r"^[^<>]*: \["
+            r"([a-zA-Z0-9_]{2,16}): "
+            r"Triggered \[([a-zA-Z0-9_]+)\] ?"
+            r"\(?(?:added ([0-9]+) to value|set value to ([0-9]+))?\)?"
+            r"\]",
+            Trigger, 1, 2, 3, 4
+        ),
+        legacy_whitelist(
+            r"^[^<>]*: Added ([a-zA-Z0-9_]{2,16}) to the whitelist",
+            r"^[^<>]*: Player is already whitelisted",
+            WhitelistAdd
+        ),
+        legacy_whitelist(
+            r"^[^<>]*: Removed ([a-zA-Z0-9_]{2,16}) from the whitelist",
+            r"^[^<>]*: Player is not whitelisted|^[^<>]*: Could not remove [a-zA-Z0-9_]{2,16} from the whitelist",
+            WhitelistRemove
+        ),
+        legacy_god_question,
+    ]
+
+    def legacy(line):
+        return [parsed for parse in legacy_parsers if (parsed := parse(line))]
+
+    # Both must find the same events, aside from RawData, which LineParser dropped, and events registered since (e.g.
+    # TickQuery), which the legacy parsers never had.
+    for corpus_line in set(corpus):
+        assert sorted(type(event).__name__ for event in legacy(corpus_line) if not isinstance(event, RawData)) == \
+            sorted(type(event).__name__ for event in parser.parse(corpus_line) if not isinstance(event, TickQuery)), \
+            corpus_line
+
+    for name, parse in [("per-event parse", legacy), ("LineParser", parser.parse)]:
+        start = time.perf_counter()
+        for corpus_line in corpus:
+            parse(corpus_line)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {len(corpus) / elapsed:,.0f} lines/sec ({len(corpus)} lines)")
@@ -1,71 +1,247 @@
 import asyncio
+import time
+from collections import deque
 from typing import Callable, Type, Optional
 import logging
 
-from mc_event import Event, Done, PlayerMessage, PlayerJoin, \
-    PlayerLeave, Shutdown, List, Trigger, WhitelistAdd, WhitelistRemove, GodQuestion, RawData, V12ListIndicator
+from mc_event import List, V12ListIndicator, parser
+from metrics import registry
 
+LINES_PARSED = registry.counter("mcds_lines_parsed_total", "Server console lines parsed")
+EVENTS_PARSED = registry.counter("mcds_events_parsed_total", "Events parsed from the server console", label="event")
+PARSE_SECONDS = registry.histogram("mcds_parse_seconds", "Time to parse one console line")
+COMMANDS_WRITTEN = registry.counter("mcds_commands_written_total", "Console commands written to the server's stdin")
 
-class MCProcess:
-    def __init__(self, command):
-        self.command = command
 
-        self.process = None
-        self.line_buffer = []
-        self.events = [
-            RawData,
-            Done,
-            PlayerMessage,
-            PlayerJoin,
-            PlayerLeave,
-            Shutdown,
-            List,
-            V12ListIndicator,
-            Trigger,
-            WhitelistAdd,
-            WhitelistRemove,
-            GodQuestion
-        ]
-        self.event_callback: Optional[Callable] = None
-        self.tasks = set()
+class Heartbeat:
+    """
+    Liveness counters for the server's output, updated inline by the stream readers.
+    """
 
-    def spawn_task(self, coroutine):
-        task = asyncio.create_task(coroutine)
-        self.tasks.add(task)
-        task.add_done_callback(self.tasks.discard)
+    def __init__(self):
+        self.lines = 0
+        self.bytes = 0
+        self.last_seen = time.monotonic()
 
-    def listen_for_event(self, callback: Callable):
-        self.event_callback = callback
+        self._sample_time = self.last_seen
+        self._sample_lines = 0
+        self._sample_bytes = 0
 
-    def get_chunk(self, char_limit):
-        if len(self.line_buffer) == 0:
-            return None
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def beat(self, line_bytes):
+        self.lines += 1
+        self.bytes += line_bytes
+        self.last_seen = time.monotonic()
+
+    def seconds_since_last_seen(self):
+        return time.monotonic() - self.last_seen
+
+    def rates(self):
+        """
+        Returns the (lines/sec, bytes/sec) observed since the previous call.
+        """
+        now = time.monotonic()
+        elapsed = now - self._sample_time
+        if elapsed <= 0:
+            return 0.0, 0.0
+
+        lines_per_second = (self.lines - self._sample_lines) / elapsed
+        bytes_per_second = (self.bytes - self._sample_bytes) / elapsed
+        self._sample_time = now
+        self._sample_lines = self.lines
+        self._sample_bytes = self.bytes
+        return lines_per_second, bytes_per_second
+
+
+class ConsoleBuffer:
+    """
+    Bounded backlog of server console lines waiting to be sent to Discord.
+
+    Lines are kept as bytes in a deque along with a running byte total. When the total exceeds max_bytes, the oldest
+    lines are dropped and counted so the overflow can be reported. Chunk sizes are measured in bytes, which is never
+    less than the decoded character count, so a chunk always fits within a character limit. The arrival time of each
+    line is kept alongside it so consumers can measure how long output waited to be sent.
+    """
+
+    def __init__(self, max_bytes=1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lines = deque()
+        self.arrivals = deque()
+        self.size = 0
+        self.dropped = 0
+        self.has_data = asyncio.Event()
 
-        chunk = ""
-        while len(self.line_buffer) > 0:
-            line = self.line_buffer[0]
-            if len(line) + 1 > char_limit:
-                # line is too big to send any chunk, so skip it
-                self.line_buffer.pop(0)
-                continue
+    def __len__(self):
+        return len(self.lines)
 
-            if len(chunk) + len(line) + 1 > char_limit:
+    def append(self, line: bytes):
+        self.lines.append(line)
+        self.arrivals.append(time.monotonic())
+        self.size += len(line) + 1
+        while self.size > self.max_bytes:
+            self._pop()
+            self.dropped += 1
+        if not self.has_data.is_set():
+            self.has_data.set()
+
+    def prepend(self, line: bytes):
+        self.lines.appendleft(line)
+        self.arrivals.appendleft(self.arrivals[0] if self.arrivals else time.monotonic())
+        self.size += len(line) + 1
+        self.has_data.set()
+
+    def _pop(self):
+        line = self.lines.popleft()
+        self.arrivals.popleft()
+        self.size -= len(line) + 1
+        if not self.lines:
+            self.has_data.clear()
+        return line
+
+    async def wait_for_data(self):
+        await self.has_data.wait()
+
+    def oldest_age(self):
+        if not self.arrivals:
+            return 0.0
+        return time.monotonic() - self.arrivals[0]
+
+    def longest_line(self):
+        return max((len(line) + 1 for line in self.lines), default=0)
+
+    def take_dropped(self):
+        dropped = self.dropped
+        self.dropped = 0
+        return dropped
+
+    def _take(self, byte_limit):
+        taken = []
+        taken_size = 0
+        while self.lines:
+            line_size = len(self.lines[0]) + 1
+            if taken_size + line_size > byte_limit:
+                # A line too big for any chunk is left in place; see longest_line().
                 break
 
-            chunk += line + "\n"
-            self.line_buffer.pop(0)
+            taken.append(self._pop())
+            taken_size += line_size
+        return taken
 
-        if len(chunk) == 0:
+    def get_chunk(self, char_limit):
+        taken = self._take(char_limit)
+        if not taken:
             return None
+        taken.append(b"")
+        return b"\n".join(taken).decode(errors="replace")
 
-        return chunk
+    def chunks(self, char_limit, max_chunks):
+        chunks = []
+        while len(chunks) < max_chunks and (chunk := self.get_chunk(char_limit)) is not None:
+            chunks.append(chunk)
+        return chunks
+
+    def take_all(self):
+        data = b"\n".join(self.lines)
+        self.lines.clear()
+        self.arrivals.clear()
+        self.size = 0
+        self.has_data.clear()
+        return data
 
     def get_all(self):
-        data = "\n".join(self.line_buffer)
-        self.line_buffer = []
+        data = self.take_all()
         if len(data) == 0:
             return None
-        return data
+        return data.decode(errors="replace")
+
+
+class CommandWriter:
+    """
+    Queues console commands and writes them to the server's stdin in batches.
+
+    Each batch is one write of up to max_batch newline-terminated commands followed by drain(), so a slow server
+    applies backpressure instead of its stdin buffer growing unbounded. An optional pace (in seconds) between batches
+    keeps large bursts, like registering hundreds of objectives, from flooding the server thread. Callers that need to
+    know when a command was written can ask for a future.
+    """
+
+    def __init__(self, max_batch=64, pace=0.0):
+        self.max_batch = max_batch
+        self.pace = pace
+
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+
+        self.queued = 0
+        self.sent = 0
+        self.awaiting_drain = 0
+
+    def submit(self, command, want_future=False):
+        future = asyncio.get_running_loop().create_future() if want_future else None
+        self.pending.append(((command + "\n").encode(), future))
+        self.queued += 1
+        self.wakeup.set()
+        return future
+
+    async def run(self, stdin):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            while self.pending:
+                batch = []
+                while self.pending and len(batch) < self.max_batch:
+                    batch.append(self.pending.popleft())
+
+                self.awaiting_drain += len(batch)
+                try:
+                    stdin.write(b"".join(command for command, _ in batch))
+                    await stdin.drain()
+                except (ConnectionError, RuntimeError) as e:
+                    logging.exception(e)
+                    for _, future in batch:
+                        if future is not None and not future.done():
+                            future.set_exception(e)
+                    continue
+                finally:
+                    self.awaiting_drain -= len(batch)
+
+                self.sent += len(batch)
+                COMMANDS_WRITTEN.inc(amount=len(batch))
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_result(None)
+
+                if self.pace and self.pending:
+                    await asyncio.sleep(self.pace)
+
+
+class PendingQuery:
+    def __init__(self, future, match):
+        self.future = future
+        self.match = match
+
+
+class MCProcess:
+    def __init__(self, command, command_pacing_seconds=0.0):
+        self.command = command
+
+        self.process = None
+        self.heartbeat = Heartbeat()
+        self.console_buffer = ConsoleBuffer()
+        self.command_writer = CommandWriter(pace=command_pacing_seconds)
+        self.parser = parser
+        self.event_callback: Optional[Callable] = None
+        # An optional ConsoleArchive that every line is appended to, along with the events parsed from it.
+        self.archive = None
+
+        self.queries = {}
+        self.awaiting_response = {}
+
+    def listen_for_event(self, callback: Callable):
+        self.event_callback = callback
 
     async def _read_stream(self, stream):
         v12_list_indicated = False
@@ -77,21 +253,29 @@ class MCProcess:
             if not line:
                 return
 
-            line = line.decode().strip()
-            self.line_buffer.append(line)
+            self.heartbeat.beat(len(line))
+
+            raw_line = line.strip()
+            self.console_buffer.append(raw_line)
+            line = raw_line.decode(errors="replace")
 
-            if self.event_callback is not None:
-                if v12_list_indicated:
-                    list_event = List.from_v12(line)
-                    self.spawn_task(self.event_callback(list_event))
-                    v12_list_indicated = False
+            parse_start = time.perf_counter()
+            events = self.parser.parse(line)
+            PARSE_SECONDS.observe(time.perf_counter() - parse_start)
+            LINES_PARSED.inc()
+            if v12_list_indicated:
+                events.insert(0, List.from_v12(line))
+                v12_list_indicated = False
+            if self.archive is not None:
+                self.archive.append(raw_line, events)
 
-                for event in self.events:
-                    parsed = event.parse(line)
-                    if parsed:
-                        self.spawn_task(self.event_callback(parsed))
-                        if event == V12ListIndicator:
-                            v12_list_indicated = True
+            for parsed in events:
+                EVENTS_PARSED.inc(type(parsed).__name__)
+                self._resolve_query(parsed)
+                if isinstance(parsed, V12ListIndicator):
+                    v12_list_indicated = True
+                if self.event_callback is not None:
+                    await self.event_callback(parsed)
 
     async def poll(self):
         self.process = await asyncio.create_subprocess_exec(
@@ -101,15 +285,78 @@ class MCProcess:
             stdin=asyncio.subprocess.PIPE
         )
 
-        await asyncio.gather(
-            self._read_stream(self.process.stdout),
-            self._read_stream(self.process.stderr),
-        )
+        writer_task = asyncio.create_task(self.command_writer.run(self.process.stdin))
+        try:
+            await asyncio.gather(
+                self._read_stream(self.process.stdout),
+                self._read_stream(self.process.stderr),
+            )
+
+            await self.process.wait()
+        finally:
+            writer_task.cancel()
+
+    async def write(self, message, wait=False):
+        """
+        Queues a console command. With wait=True, returns once the command has been written and drained.
+        """
+        future = self.command_writer.submit(message, want_future=wait)
+        if future is not None:
+            await future
+
+    async def query(self, command, expect, timeout=10, match=None):
+        """
+        Writes a console command and returns the next `expect` event parsed from the server's output for which
+        `match(event)` is true (any `expect` event if `match` is None).
+
+        Identical queries that are already in flight share one command and one response, so e.g. several joins at once
+        send a single `list`. Raises asyncio.TimeoutError if no response is parsed within `timeout` seconds. A response
+        that arrives up to `timeout` seconds after that is still taken as the timed out query's, and discarded, rather
+        than answering a newer query.
+        """
+        key = (command, expect)
+        future = self.queries.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.queries[key] = future
+            pending = PendingQuery(future, match)
+            self.awaiting_response.setdefault(expect, deque()).append(pending)
+            future.add_done_callback(lambda _: self._end_query(key, future))
+            loop.call_later(timeout, self._expire_query, pending, expect, timeout)
+            await self.write(command)
+        return await asyncio.shield(future)
+
+    def _resolve_query(self, event):
+        awaiting = self.awaiting_response.get(type(event))
+        if not awaiting:
+            return
+        for pending in awaiting:
+            if pending.match is None or pending.match(event):
+                awaiting.remove(pending)
+                if pending.future.done():
+                    logging.info(f"discarding a late {type(event).__name__} response to a timed out query")
+                else:
+                    pending.future.set_result(event)
+                return
+
+    def _end_query(self, key, future):
+        if self.queries.get(key) is future:
+            del self.queries[key]
+
+    def _expire_query(self, pending, expect, late_seconds):
+        if pending.future.done():
+            return
+        pending.future.set_exception(asyncio.TimeoutError())
+        # A new identical query sends its own command now, but this one's response may still be on its way.
+        asyncio.get_running_loop().call_later(late_seconds, self._forget_query, expect, pending)
 
-        await self.process.wait()
+    def _forget_query(self, expect, pending):
+        awaiting = self.awaiting_response.get(expect)
+        if awaiting and pending in awaiting:
+            awaiting.remove(pending)
 
-    async def write(self, message):
-        assert self.process is not None
-        message = message + "\n"
-        message = message.encode()
-        self.process.stdin.write(message)
+    async def write_many(self, messages, wait=False):
+        futures = [self.command_writer.submit(message, want_future=wait) for message in messages]
+        if wait:
+            await asyncio.gather(*futures)
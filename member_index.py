@@ -0,0 +1,88 @@
+import re
+
+
+class MemberIndex:
+    """
+    Case-insensitive index from usernames, global (display) names and nicknames to guild members, across guilds.
+
+    Kept up to date incrementally from member events, so resolving a mention is a dict lookup rather than a scan of
+    every guild's member cache. When several members share a name, the one indexed first wins.
+    """
+
+    MENTION_PATTERN = re.compile(r"@([a-zA-Z0-9_]{2,16})")
+
+    def __init__(self):
+        self.members = {}
+        self.member_names = {}
+        self.users = {}
+
+    @staticmethod
+    def _key(member):
+        return member.guild.id, member.id
+
+    @staticmethod
+    def _names(member):
+        names = {member.name, getattr(member, "global_name", None), member.nick}
+        return {name.lower() for name in names if name}
+
+    def build(self, guilds):
+        self.members = {}
+        self.member_names = {}
+        self.users = {}
+        for guild in guilds:
+            for member in guild.members:
+                self.add(member)
+
+    def add(self, member):
+        key = self._key(member)
+        if key in self.member_names:
+            self.remove(member)
+
+        names = self._names(member)
+        self.member_names[key] = names
+        for name in names:
+            self.members.setdefault(name, {})[key] = member
+        self.users.setdefault(member.id, {})[key] = member
+
+    def remove(self, member):
+        key = self._key(member)
+        for name in self.member_names.pop(key, ()):
+            members = self.members.get(name)
+            if members is None:
+                continue
+            members.pop(key, None)
+            if not members:
+                del self.members[name]
+
+        users = self.users.get(member.id)
+        if users is not None:
+            users.pop(key, None)
+            if not users:
+                del self.users[member.id]
+
+    def get(self, name):
+        members = self.members.get(name.lower())
+        if not members:
+            return None
+        return next(iter(members.values()))
+
+    def get_by_id(self, user_id):
+        members = self.users.get(user_id)
+        if not members:
+            return None
+        return next(iter(members.values()))
+
+    def replace_mentions(self, message, resolve=None):
+        """
+        Replaces every @name in `message` with the mention of the member `resolve` (by default, get) returns for it.
+        """
+        if resolve is None:
+            resolve = self.get
+
+        def replace(match):
+            member = resolve(match.group(1))
+            if member is None:
+                return match.group(0)
+            return member.mention
+
+        return self.MENTION_PATTERN.sub(replace, message)
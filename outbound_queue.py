@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from util import create_task
+
+
+class OutboundQueue:
+    """
+    Per-channel queue of outgoing Discord messages.
+
+    Messages enqueued within `window` seconds of each other are joined into one message of at most `char_limit`
+    characters, in the order they were enqueued. Each channel has its own worker which sends at most
+    `rate_limit_messages` per `rate_limit_seconds`, so a burst of events becomes a few merged sends instead of a burst of
+    REST calls for discord.py to throttle.
+    """
+
+    def __init__(self, send, window=0.25, char_limit=2000, rate_limit_messages=5, rate_limit_seconds=5):
+        self.send = send
+        self.window = window
+        self.char_limit = char_limit
+        self.rate_limit_messages = rate_limit_messages
+        self.rate_limit_seconds = rate_limit_seconds
+
+        self.pending = {}
+        self.wakeups = {}
+        self.workers = {}
+        self.send_times = {}
+        self.in_flight = 0
+
+        self.sent_messages = 0
+        self.merged_messages = 0
+        self.last_time_in_queue = 0.0
+        self.max_time_in_queue = 0.0
+
+    def enqueue(self, channel_name, message):
+        if channel_name not in self.pending:
+            self.pending[channel_name] = deque()
+            self.wakeups[channel_name] = asyncio.Event()
+            self.send_times[channel_name] = deque()
+            self.workers[channel_name] = create_task(self._work(channel_name))
+
+        self.pending[channel_name].append((time.monotonic(), message))
+        self.wakeups[channel_name].set()
+
+    def depth(self, channel_name=None):
+        if channel_name is not None:
+            return len(self.pending.get(channel_name, ()))
+        return sum(len(pending) for pending in self.pending.values())
+
+    def _take_batch(self, channel_name):
+        pending = self.pending[channel_name]
+        enqueue_time, batch = pending.popleft()
+        merged = 1
+        while pending and len(batch) + 1 + len(pending[0][1]) <= self.char_limit:
+            batch += "\n" + pending.popleft()[1]
+            merged += 1
+        return enqueue_time, batch, merged
+
+    async def _wait_for_headroom(self, channel_name):
+        send_times = self.send_times[channel_name]
+        while True:
+            now = time.monotonic()
+            while send_times and now - send_times[0] > self.rate_limit_seconds:
+                send_times.popleft()
+            if len(send_times) < self.rate_limit_messages:
+                return
+            await asyncio.sleep(self.rate_limit_seconds - (now - send_times[0]))
+
+    async def _work(self, channel_name):
+        pending = self.pending[channel_name]
+        wakeup = self.wakeups[channel_name]
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+            await asyncio.sleep(self.window)
+
+            while pending:
+                await self._wait_for_headroom(channel_name)
+                enqueue_time, batch, merged = self._take_batch(channel_name)
+
+                time_in_queue = time.monotonic() - enqueue_time
+                self.last_time_in_queue = time_in_queue
+                self.max_time_in_queue = max(self.max_time_in_queue, time_in_queue)
+                self.sent_messages += 1
+                self.merged_messages += merged
+
+                self.send_times[channel_name].append(time.monotonic())
+                self.in_flight += 1
+                try:
+                    await self.send(channel_name, batch)
+                except Exception as e:
+                    logging.exception(e)
+                finally:
+                    self.in_flight -= 1
+
+    async def flush(self, timeout=10):
+        """
+        Waits (up to `timeout` seconds) for every queued message to be sent.
+        """
+        deadline = time.monotonic() + timeout
+        while self.depth() + self.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
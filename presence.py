@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import discord
+
+from util import create_task
+
+
+class PresenceManager:
+    """
+    Holds the bot's desired presence and sends it to the gateway at a bounded rate.
+
+    Updates are debounced on both edges: the first change after a quiet period is sent immediately, and changes that
+    arrive within `min_interval` of the last update are folded into a single trailing update carrying the latest state.
+    Updates that wouldn't change what Discord already shows are skipped.
+    """
+
+    INITIALIZING = "initializing"
+    READY = "ready"
+    SHUTTING_DOWN = "shutting down"
+
+    # The gateway allows about 5 presence updates per minute.
+    MIN_INTERVAL_SECONDS = 12
+    LAGGING_TPS = 18
+
+    def __init__(self, change_presence, category_name, min_interval=MIN_INTERVAL_SECONDS):
+        self.change_presence = change_presence
+        self.category_name = category_name
+        self.min_interval = min_interval
+
+        self.phase = self.INITIALIZING
+        self.player_count = 0
+        self.tps = None
+
+        self.sent_state = None
+        self.last_sent = None
+        self.pending_task = None
+        self.gateway_calls = 0
+
+    def set(self, phase=None, player_count=None, tps=None):
+        if phase is not None:
+            self.phase = phase
+        if player_count is not None:
+            self.player_count = player_count
+        if tps is not None:
+            self.tps = tps
+
+        if self.pending_task is not None:
+            # The pending update will pick up the latest state when it runs.
+            return
+        if self._state() == self.sent_state:
+            return
+
+        delay = 0
+        if self.last_sent is not None:
+            delay = max(0, self.min_interval - (time.monotonic() - self.last_sent))
+        self.pending_task = create_task(self._send_after(delay))
+
+    def _state(self):
+        if self.phase == self.READY:
+            players = 'player' if self.player_count == 1 else 'players'
+            name = f"{self.player_count} {players} on {self.category_name}"
+            # Only shown when the server is lagging, so a healthy server's presence doesn't change with every sample.
+            if self.tps is not None and self.tps < self.LAGGING_TPS:
+                name += f" ({self.tps:.0f} TPS)"
+            return discord.Status.online, name
+        if self.phase == self.SHUTTING_DOWN:
+            return discord.Status.dnd, f"{self.category_name} shut down..."
+        return discord.Status.idle, f"{self.category_name} initialize..."
+
+    async def _send_after(self, delay):
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        self.pending_task = None
+        state = self._state()
+        if state == self.sent_state:
+            return
+        self.sent_state = state
+        self.last_sent = time.monotonic()
+        self.gateway_calls += 1
+
+        status, name = state
+        activity = discord.Activity(name=name, type=discord.ActivityType.watching)
+        await self.change_presence(status=status, activity=activity)
+
+
+if __name__ == '__main__':
+    # Stress check: 50 joins and leaves over 10 seconds should result in a handful of gateway calls.
+    import random
+
+    async def main():
+        calls = []
+
+        async def change_presence(status, activity):
+            calls.append((time.monotonic(), status, activity.name))
+
+        presence = PresenceManager(change_presence, "mc-server", min_interval=2)
+        presence.set(phase=PresenceManager.READY)
+
+        player_count = 0
+        for _ in range(50):
+            await asyncio.sleep(10 / 50)
+            player_count = max(0, player_count + random.choice([-1, 1]))
+            presence.set(player_count=player_count)
+        await asyncio.sleep(presence.min_interval + 0.5)
+
+        for _, status, name in calls:
+            print(f"{status}: {name}")
+        # 10 seconds at one update per 2 seconds, plus the leading update and the final trailing one.
+        assert presence.gateway_calls <= 10 / presence.min_interval + 2, presence.gateway_calls
+        assert calls[-1][2] == f"{player_count} {'player' if player_count == 1 else 'players'} on mc-server"
+
+    asyncio.run(main())
@@ -0,0 +1,267 @@
+"""
+Runs MCSync end to end against a recorded server log, with replay_server.py standing in for the Minecraft server and a
+fake Discord transport recording what would have been sent.
+
+    python3 replay.py storm --players 100 > storm.log
+    python3 replay.py run storm.log --speed 0 --guilds 2
+
+`storm` writes a synthetic log of a startup with a burst of joins, chat, triggers and leaves. `run` replays a log and
+reports parse throughput, event handler latency, and how many messages, files, presence updates and console commands
+the pipeline produced.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+replay_dir = pathlib.Path(__file__).parent.resolve()
+
+
+class FakeChannel:
+    def __init__(self, name, category, latency):
+        self.name = name
+        self.category = category
+        self.guild = category.guild
+        self.latency = latency
+        self.sent = []
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, file=None):
+        await asyncio.sleep(self.latency)
+        self.sent.append((time.monotonic(), content, file.filename if file is not None else None))
+
+
+class FakeCategory:
+    def __init__(self, name, guild):
+        self.name = name
+        self.guild = guild
+        self.text_channels = []
+
+    async def create_text_channel(self, name):
+        channel = FakeChannel(name, self, self.guild.latency)
+        self.text_channels.append(channel)
+        return channel
+
+
+class FakeGuild:
+    def __init__(self, id_, latency):
+        self.id = id_
+        self.latency = latency
+        self.categories = []
+        self.members = []
+
+    def __str__(self):
+        return f"guild-{self.id}"
+
+    async def create_category(self, name):
+        category = FakeCategory(name, self)
+        self.categories.append(category)
+        return category
+
+    def get_member(self, member_id):
+        return None
+
+    def channels(self):
+        return [channel for category in self.categories for channel in category.text_channels]
+
+
+class TimedParser:
+    """
+    Wraps a LineParser to count lines and events and accumulate the time spent parsing.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.lines = 0
+        self.seconds = 0.0
+        self.events = {}
+
+    def parse(self, line):
+        start = time.perf_counter()
+        events = self.parser.parse(line)
+        self.seconds += time.perf_counter() - start
+        self.lines += 1
+        for event in events:
+            name = type(event).__name__
+            self.events[name] = self.events.get(name, 0) + 1
+        return events
+
+
+def storm(players, seed=0):
+    """
+    Yields the lines of a synthetic log: a server startup followed by `players` joins within a few seconds, chat,
+    triggers, and everyone leaving.
+    """
+    rng = random.Random(seed)
+    clock = [12 * 3600]
+
+    def line(message, thread="Server thread", advance=0):
+        clock[0] += advance
+        hours, remainder = divmod(clock[0], 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return f"[{hours:02d}:{minutes:02d}:{seconds:02d}] [{thread}/INFO]: {message}"
+
+    yield line("Starting minecraft server version 1.21.1")
+    for percent in range(0, 100, 4):
+        yield line(f"Preparing spawn area: {percent}%", thread="Worker-Main-2")
+    yield line("Done (11.204s)! For help, type \"help\"", advance=2)
+
+    names = [f"player{i:03d}" for i in range(players)]
+    for i, name in enumerate(names):
+        yield line(f"{name}[/127.0.0.1:{50000 + i}] logged in with entity id {i} at (0.5, 64.0, 0.5)")
+        yield line(f"{name} joined the game", advance=1 if i % 20 == 19 else 0)
+
+    for i in range(players * 3):
+        name = rng.choice(names)
+        roll = rng.random()
+        if roll < 0.7:
+            yield line(f"<{name}> {rng.choice(['hi', 'lag?', 'anyone at spawn', 'gg', 'where is the nether portal'])}")
+        elif roll < 0.95:
+            yield line(f"[{name}: Triggered [{rng.choice(['roll', 'wave', 'dance'])}]]")
+        else:
+            yield line(f"<{name}> God, what should I build next?")
+        if i % 10 == 9:
+            clock[0] += 1
+
+    for name in names:
+        yield line(f"{name} lost connection: Disconnected")
+        yield line(f"{name} left the game")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def replay(log_path, speed, guild_count, discord_latency):
+    config_dir = tempfile.mkdtemp(prefix="mcds-replay-")
+    config_path = f"{config_dir}/config.json"
+    with open(config_path, "w") as config_file:
+        json.dump({
+            "launch_command": f"{replay_dir}/replay_server.py",
+            "discord_token": "replay",
+            "inactive_shutdown_seconds": 24 * 60 * 60,
+            "console_archive_dir": f"{config_dir}/console",
+        }, config_file)
+    os.environ["MCDS_CONFIG"] = config_path
+    os.environ["MCDS_REPLAY_LOG"] = str(pathlib.Path(log_path).resolve())
+    os.environ["MCDS_REPLAY_SPEED"] = str(speed)
+
+    # Config is read on import, so MCSync can only be imported once the replay config is in place.
+    from mc_discord_sync import MCSync
+
+    guilds = [FakeGuild(i, discord_latency) for i in range(guild_count)]
+    presence_updates = []
+
+    class ReplaySync(MCSync):
+        @property
+        def guilds(self):
+            return guilds
+
+        @property
+        def user(self):
+            return None
+
+        async def change_presence(self, status=None, activity=None):
+            presence_updates.append((status, activity.name))
+
+        async def close(self):
+            pass
+
+    client = ReplaySync(intents=None)
+    parser = TimedParser(client.mc_process.parser)
+    client.mc_process.parser = parser
+
+    handler_latencies = []
+    published = {}
+
+    def timed(handler):
+        async def wrapper(event):
+            try:
+                await handler(event)
+            finally:
+                handler_latencies.append(time.perf_counter() - published.pop(id(event), time.perf_counter()))
+        return wrapper
+
+    for event_type, handler in list(client.event_bus.handlers.items()):
+        client.event_bus.handlers[event_type] = timed(handler)
+
+    publish = client.event_bus.publish
+
+    async def timed_publish(event):
+        if type(event) in client.event_bus.handlers:
+            published[id(event)] = time.perf_counter()
+        await publish(event)
+    client.event_bus.publish = timed_publish
+
+    start = time.perf_counter()
+    await client.on_ready()
+    await client.mc_process_task
+    replay_seconds = time.perf_counter() - start
+
+    for queue in client.event_bus.queues.values():
+        await queue.join()
+    await client.console_flusher.flush()
+    await client.outbound_queue.flush()
+    drain_seconds = time.perf_counter() - start - replay_seconds
+
+    for task in [client.event_bus_task, client.server_data_task, client.heartbeat_task, client.emote_reload_task,
+                 client.identity_links_task, client.console_archive_task, client.loop_watchdog_task,
+                 client.shutdown_task]:
+        if task is not None:
+            task.cancel()
+    if client.console_archive is not None:
+        await client.console_archive.close()
+
+    print(f"replayed {parser.lines} lines in {replay_seconds:.2f}s, drained in {drain_seconds:.2f}s")
+    print(f"parse: {parser.lines / parser.seconds if parser.seconds else 0:,.0f} lines/s, "
+          f"{parser.seconds / max(parser.lines, 1) * 1e6:.2f}us per line")
+    for name, count in sorted(parser.events.items(), key=lambda item: -item[1]):
+        print(f"  {name}: {count}")
+    print(f"handler latency: p50 {percentile(handler_latencies, 0.5) * 1000:.2f}ms, "
+          f"p95 {percentile(handler_latencies, 0.95) * 1000:.2f}ms, "
+          f"max {max(handler_latencies, default=0) * 1000:.2f}ms over {len(handler_latencies)} events")
+    print(f"event loop: max lag {client.loop_watchdog.max_lag * 1000:.1f}ms")
+    print(f"console commands written: {client.mc_process.command_writer.sent}")
+    print(f"outbound queue: {client.outbound_queue.sent_messages} sent, {client.outbound_queue.merged_messages} merged, "
+          f"max {client.outbound_queue.max_time_in_queue:.2f}s in queue")
+    print(f"console flusher: max latency {client.console_flusher.max_latency:.2f}s")
+    print(f"presence updates: {len(presence_updates)}")
+    for guild in guilds:
+        sends = ", ".join(
+            f"#{channel.name} {sum(1 for _, _, file_name in channel.sent if file_name is None)} messages/"
+            f"{sum(1 for _, _, file_name in channel.sent if file_name is not None)} files"
+            for channel in guild.channels()
+        )
+        print(f"  {guild}: {sends}")
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = argument_parser.add_subparsers(dest="command", required=True)
+
+    storm_parser = commands.add_parser("storm", help="write a synthetic startup storm log to stdout")
+    storm_parser.add_argument("--players", type=int, default=100)
+    storm_parser.add_argument("--seed", type=int, default=0)
+
+    run_parser = commands.add_parser("run", help="replay a log through MCSync")
+    run_parser.add_argument("log")
+    run_parser.add_argument("--speed", type=float, default=0, help="playback speed; 0 is as fast as possible")
+    run_parser.add_argument("--guilds", type=int, default=1)
+    run_parser.add_argument("--discord-latency", type=float, default=0.05, help="seconds per fake send")
+
+    args = argument_parser.parse_args()
+    if args.command == "storm":
+        for storm_line in storm(args.players, args.seed):
+            sys.stdout.write(storm_line + "\n")
+    else:
+        asyncio.run(replay(args.log, args.speed, args.guilds, args.discord_latency))
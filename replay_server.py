@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+A stand-in Minecraft server that replays a recorded console log, for exercising MCSync without a real server.
+
+Use it as `launch_command`. It is configured through the environment, since MCProcess runs the command without
+arguments:
+
+    MCDS_REPLAY_LOG     path to the recorded log (e.g. a server's logs/latest.log, optionally .gz)
+    MCDS_REPLAY_SPEED   playback speed relative to the log's timestamps (default 1; 0 replays as fast as possible)
+    MCDS_REPLAY_LINGER  seconds to keep answering commands after the log ends (default 1)
+
+Lines are written with the gaps between their timestamps divided by the speed. Commands read from stdin are answered
+the way a server would: `list` from the players that joined and left in the replayed log so far, `whitelist
+add/remove` from an in-memory whitelist, `tick query` with a healthy tick rate, and `stop` by stopping.
+"""
+import gzip
+import os
+import re
+import sys
+import threading
+import time
+
+TIMESTAMP_PATTERN = re.compile(r"^\[(\d{2}):(\d{2}):(\d{2})")
+JOIN_PATTERN = re.compile(r"^[^<>*]*: ([a-zA-Z0-9_]{2,16}) joined the game")
+LEAVE_PATTERN = re.compile(r"^[^<>*]*: ([a-zA-Z0-9_]{2,16}) left the game")
+
+MAX_PLAYERS = 20
+
+
+class ReplayServer:
+    def __init__(self, log_path, speed=1.0, linger=1.0):
+        self.log_path = log_path
+        self.speed = speed
+        self.linger = linger
+
+        self.players = []
+        self.whitelist = set()
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def _open_log(self):
+        if self.log_path.endswith(".gz"):
+            return gzip.open(self.log_path, "rt", errors="replace")
+        return open(self.log_path, errors="replace")
+
+    @staticmethod
+    def _seconds(line):
+        match = TIMESTAMP_PATTERN.match(line)
+        if match is None:
+            return None
+        hours, minutes, seconds = (int(group) for group in match.groups())
+        return hours * 3600 + minutes * 60 + seconds
+
+    def emit(self, line, flush=True):
+        with self.lock:
+            sys.stdout.write(line + "\n")
+            if flush:
+                sys.stdout.flush()
+
+    def respond(self, message):
+        self.emit(f"[{time.strftime('%H:%M:%S')}] [Server thread/INFO]: {message}")
+
+    def _track_players(self, line):
+        if match := JOIN_PATTERN.match(line):
+            if match.group(1) not in self.players:
+                self.players.append(match.group(1))
+        elif match := LEAVE_PATTERN.match(line):
+            if match.group(1) in self.players:
+                self.players.remove(match.group(1))
+
+    def replay(self):
+        previous = None
+        start = time.monotonic()
+        elapsed = 0.0
+        with self._open_log() as log_file:
+            for i, line in enumerate(log_file):
+                if self.stopped.is_set():
+                    return
+                line = line.rstrip("\r\n")
+
+                seconds = self._seconds(line)
+                if self.speed and seconds is not None:
+                    if previous is not None and seconds >= previous:
+                        elapsed += (seconds - previous) / self.speed
+                        delay = start + elapsed - time.monotonic()
+                        if delay > 0:
+                            self.stopped.wait(delay)
+                    previous = seconds
+
+                self._track_players(line)
+                # As fast as possible, flushing every line would make the pipe the bottleneck.
+                self.emit(line, flush=bool(self.speed) or i % 256 == 0)
+        sys.stdout.flush()
+
+    def handle(self, command):
+        args = command.split()
+        if not args:
+            return
+        if args[0] == "list":
+            self.respond(
+                f"There are {len(self.players)} of a max of {MAX_PLAYERS} players online: {', '.join(self.players)}"
+            )
+        elif args[0] == "whitelist" and len(args) == 3:
+            player = args[2]
+            if args[1] == "add":
+                if player in self.whitelist:
+                    self.respond("Player is already whitelisted")
+                else:
+                    self.whitelist.add(player)
+                    self.respond(f"Added {player} to the whitelist")
+            elif args[1] == "remove":
+                if player in self.whitelist:
+                    self.whitelist.remove(player)
+                    self.respond(f"Removed {player} from the whitelist")
+                else:
+                    self.respond("Player is not whitelisted")
+        elif args[:2] == ["tick", "query"]:
+            self.respond("The game is running normally")
+            self.emit("Target tick rate: 20.0 per second.")
+            self.emit("Average time per tick: 3.2ms (Target: 50.0ms)")
+        elif args[0] == "stop":
+            self.respond("Stopping server")
+            self.stopped.set()
+
+    def read_commands(self):
+        for command in sys.stdin:
+            self.handle(command.strip())
+            if self.stopped.is_set():
+                return
+        self.stopped.set()
+
+    def run(self):
+        threading.Thread(target=self.read_commands, daemon=True).start()
+        self.replay()
+        self.stopped.wait(self.linger)
+
+
+if __name__ == '__main__':
+    server = ReplayServer(
+        os.environ["MCDS_REPLAY_LOG"],
+        speed=float(os.environ.get("MCDS_REPLAY_SPEED", 1)),
+        linger=float(os.environ.get("MCDS_REPLAY_LINGER", 1)),
+    )
+    server.run()
@@ -0,0 +1,58 @@
+class Roster:
+    """
+    The set of online players, kept up to date from join and leave events.
+
+    Players are stored in order with a name-to-index table, so membership and positional lookups (used by emote
+    targets) are both O(1). The server's `list` output is only used to reconcile the roster, and reconcile() reports
+    any drift it had to correct.
+    """
+
+    def __init__(self):
+        self._players = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self._players)
+
+    def __contains__(self, username):
+        return username in self._index
+
+    def __iter__(self):
+        return iter(self._players)
+
+    def players(self):
+        return list(self._players)
+
+    def player_at(self, index):
+        if 0 <= index < len(self._players):
+            return self._players[index]
+        return None
+
+    def add(self, username):
+        if username in self._index:
+            return False
+        self._index[username] = len(self._players)
+        self._players.append(username)
+        return True
+
+    def remove(self, username):
+        index = self._index.pop(username, None)
+        if index is None:
+            return False
+        del self._players[index]
+        for i in range(index, len(self._players)):
+            self._index[self._players[i]] = i
+        return True
+
+    def reconcile(self, players):
+        """
+        Replaces the roster with the server's authoritative player list. Returns the (missing, unexpected) players: those
+        the server listed that the roster didn't have, and those the roster had that the server didn't list.
+        """
+        missing = [player for player in players if player not in self._index]
+        listed = set(players)
+        unexpected = [player for player in self._players if player not in listed]
+
+        self._players = list(players)
+        self._index = {player: i for i, player in enumerate(self._players)}
+        return missing, unexpected